@@ -0,0 +1,277 @@
+import json
+import os
+import re
+import threading
+import time
+from collections import deque, namedtuple
+
+from history import parse_window
+from logs import get_logger
+from metrics import metrics
+from registry import SENSORS_CONFIG
+
+logger = get_logger("alerts")
+
+# Délai minimal (s) entre deux déclenchements d'une même règle
+ALERT_COOLDOWN = parse_window(os.getenv("ALERT_COOLDOWN", "15m"))
+
+ALERTS = metrics.counter("alerts_total", "Transitions des règles d'alerte", ("rule", "state"))
+
+# Définition d'une règle : nom, expression, message personnalisé, hystérésis, délai entre alertes,
+# catégorie de notification (routage vers un canal)
+RuleSpec = namedtuple("RuleSpec", ["name", "expression", "message", "hysteresis", "cooldown", "category"])
+
+# "cuisine_congelateur_t > -15 for 10 min"
+_THRESHOLD = re.compile(r"\s*(\w+)\s*(>=|<=|>|<)\s*(-?\d+(?:\.\d+)?)\s*(?:for\s+(.+?))?\s*")
+# "ext_t drops 5°C in 1h"
+_CHANGE = re.compile(r"\s*(\w+)\s+(drops|rises)\s+(\d+(?:\.\d+)?)\s*(?:°?c)?\s+in\s+(.+?)\s*", re.IGNORECASE)
+
+OK, PENDING, FIRING = "ok", "pending", "firing"
+
+
+class ThresholdRule:
+    """Seuil franchi en continu pendant `duration` secondes (anti-rebond)"""
+
+    def __init__(self, spec, key, operator, threshold, duration):
+        self.spec = spec
+        self.key = key
+        self.operator = operator
+        self.threshold = threshold
+        self.duration = duration
+        self.debounce = duration
+        # Seuil de retour à la normale, décalé de l'hystérésis
+        above = operator in (">", ">=")
+        clear = threshold - spec.hysteresis if above else threshold + spec.hysteresis
+        self._breached = _compare(operator, threshold)
+        self._cleared = _compare("<" if above else ">", clear)
+
+    def check(self, value, timestamp):
+        """True si la condition est vérifiée, False si la valeur est revenue sous le seuil d'hystérésis,
+        None entre les deux (état inchangé)"""
+        if self._breached(value):
+            return True
+        if self._cleared(value):
+            return False
+        return None
+
+    def describe(self, value):
+        return f"{self.key} = {value} ({self.operator} {self.threshold})"
+
+
+class ChangeRule:
+    """Variation d'au moins `delta` sur une fenêtre glissante de `duration` secondes"""
+
+    def __init__(self, spec, key, direction, delta, duration):
+        self.spec = spec
+        self.key = key
+        self.direction = direction
+        self.delta = delta
+        self.duration = duration
+        self.debounce = 0
+        # Deque monotone : référence (max pour une baisse, min pour une hausse) de la fenêtre en O(1) amorti
+        self._window = deque()
+
+    def check(self, value, timestamp):
+        window = self._window
+        drops = self.direction == "drops"
+        while window and (window[-1][1] <= value if drops else window[-1][1] >= value):
+            window.pop()
+        window.append((timestamp, value))
+        while window[0][0] < timestamp - self.duration:
+            window.popleft()
+        change = window[0][1] - value if drops else value - window[0][1]
+        if change >= self.delta:
+            return True
+        if change < self.delta - self.spec.hysteresis:
+            return False
+        return None
+
+    def describe(self, value):
+        reference = self._window[0][1]
+        return f"{self.key} {reference} → {value} ({self.direction} {self.delta} en {self.duration // 60} min)"
+
+
+def _compare(operator, threshold):
+    if operator == ">":
+        return lambda value: value > threshold
+    if operator == ">=":
+        return lambda value: value >= threshold
+    if operator == "<":
+        return lambda value: value < threshold
+    return lambda value: value <= threshold
+
+
+def compile_rule(spec):
+    """Compile l'expression d'une règle en prédicat"""
+    match = _CHANGE.fullmatch(spec.expression)
+    if match:
+        key, direction, delta, window = match.groups()
+        return ChangeRule(spec, key, direction.lower(), float(delta), parse_window(window))
+    match = _THRESHOLD.fullmatch(spec.expression)
+    if match:
+        key, operator, threshold, window = match.groups()
+        return ThresholdRule(spec, key, operator, float(threshold), parse_window(window) if window else 0)
+    raise ValueError(f"Règle invalide: {spec.expression}")
+
+
+def load_rules(path=SENSORS_CONFIG):
+    """Charge les définitions de règles (section "rules" du fichier de configuration)"""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    specs = []
+    for item in data.get("rules", []):
+        expression = item["rule"]
+        specs.append(RuleSpec(
+            name=item.get("name", expression),
+            expression=expression,
+            message=item.get("message"),
+            hysteresis=float(item.get("hysteresis", 0.5)),
+            cooldown=parse_window(item["cooldown"]) if "cooldown" in item else ALERT_COOLDOWN,
+            category=item.get("category", "alert"),
+        ))
+    return specs
+
+
+class _RuleState:
+    __slots__ = ("rule", "state", "since", "last_alert", "notified", "value", "timer")
+
+    def __init__(self, rule):
+        self.rule = rule
+        self.state = OK
+        self.since = None
+        self.last_alert = None
+        self.notified = False
+        # Dernière valeur reçue, et minuterie de fin d'anti-rebond tant que la règle est en attente
+        self.value = None
+        self.timer = None
+
+
+class AlertEngine:
+    """Évalue les règles d'alerte à chaque mesure, uniquement celles qui dépendent du capteur reçu"""
+
+    def __init__(self, notify):
+        self.notify = notify
+        # clé du capteur → états des règles qui en dépendent
+        self._index = {}
+        self._lock = threading.Lock()
+        # Nombre de règles en attente (anti-rebond en cours)
+        self.pending = 0
+
+    def load(self, specs):
+        """Compile et indexe les règles ; l'état des règles inchangées est conservé"""
+        previous = {state.rule.spec: state for states in self._index.values() for state in states}
+        index = {}
+        for spec in specs:
+            try:
+                state = previous.get(spec) or _RuleState(compile_rule(spec))
+            except ValueError as e:
+                logger.error("❌ %s", e)
+                continue
+            index.setdefault(state.rule.key, []).append(state)
+        with self._lock:
+            kept = {id(state) for states in index.values() for state in states}
+            for state in previous.values():
+                if id(state) not in kept:
+                    self._cancel(state)
+            self._index = index
+            self.pending = sum(state.state == PENDING for states in index.values() for state in states)
+        logger.info("🚨 %d règles d'alerte chargées", sum(len(states) for states in index.values()))
+        return len(specs)
+
+    def reload(self, path=SENSORS_CONFIG):
+        try:
+            specs = load_rules(path)
+        except Exception as e:
+            logger.error("❌ Erreur chargement des règles d'alerte: %s", e)
+            return 0
+        return self.load(specs)
+
+    def evaluate(self, key, value, timestamp):
+        """Fait évoluer les règles liées à `key` ; envoie les alertes et les retours à la normale"""
+        states = self._index.get(key)
+        if not states:
+            return
+        with self._lock:
+            for state in states:
+                state.value = value
+                condition = state.rule.check(value, timestamp)
+                if condition is True:
+                    if state.state == OK:
+                        state.state = PENDING
+                        state.since = timestamp
+                        self.pending += 1
+                        self._schedule(state)
+                    if state.state == PENDING and timestamp - state.since >= state.rule.debounce:
+                        self._fire(state, value, timestamp)
+                elif condition is False and state.state != OK:
+                    if state.state == FIRING and state.notified:
+                        self._resolve(state, value)
+                    elif state.state == PENDING:
+                        self.pending -= 1
+                    state.state = OK
+                    state.since = None
+                    self._cancel(state)
+
+    def still(self, key, timestamp):
+        """Valeur republiée à l'identique (ignorée avant décodage) : toujours en dépassement
+        pour les règles en attente de `key`"""
+        states = self._index.get(key)
+        if not states:
+            return
+        with self._lock:
+            for state in states:
+                if state.state == PENDING and timestamp - state.since >= state.rule.debounce:
+                    self._fire(state, state.value, timestamp)
+
+    def _schedule(self, state):
+        """Re-vérifie la règle à la fin de l'anti-rebond, même si le capteur ne publie plus d'ici là"""
+        if not state.rule.debounce:
+            return
+        state.timer = threading.Timer(state.rule.debounce, self._expire, (state, state.since))
+        state.timer.daemon = True
+        state.timer.start()
+
+    def _cancel(self, state):
+        if state.timer is not None:
+            state.timer.cancel()
+            state.timer = None
+
+    def _expire(self, state, since):
+        with self._lock:
+            state.timer = None
+            # Règle revenue à la normale (ou repassée en attente) entre-temps
+            if state.state != PENDING or state.since != since:
+                return
+            self._fire(state, state.value, max(time.time(), since + state.rule.debounce))
+
+    def stop(self):
+        with self._lock:
+            for states in self._index.values():
+                for state in states:
+                    self._cancel(state)
+
+    def _fire(self, state, value, timestamp):
+        self._cancel(state)
+        self.pending -= 1
+        state.state = FIRING
+        spec = state.rule.spec
+        # Dans le délai entre alertes : la règle passe en alerte sans nouveau message (anti-tempête)
+        state.notified = state.last_alert is None or timestamp - state.last_alert >= spec.cooldown
+        if not state.notified:
+            return
+        state.last_alert = timestamp
+        ALERTS.inc(spec.name, FIRING)
+        text = spec.message or f"🚨 **Alerte {spec.name}** : {state.rule.describe(value)}"
+        self.notify(text, category=spec.category, key=state.rule.key)
+
+    def _resolve(self, state, value):
+        spec = state.rule.spec
+        ALERTS.inc(spec.name, OK)
+        self.notify(f"✅ **{spec.name}** : retour à la normale ({state.rule.key} = {value})",
+                    category=spec.category, key=state.rule.key)
+
+    def active(self):
+        """Règles actuellement en alerte"""
+        with self._lock:
+            return [state.rule.spec.name for states in self._index.values() for state in states
+                    if state.state == FIRING]
@@ -0,0 +1,305 @@
+"""Banc de mesure hors-ligne du pipeline MQTT → Discord.
+
+Un générateur injecte des payloads zigbee2mqtt / zwave / nukihub synthétiques dans
+MQTTManager._on_message (comme le ferait la boucle réseau de paho), et un faux
+transport Discord remplace send_simple_message pour horodater chaque alerte reçue.
+
+Exemple : python bench.py --rate 2000 --duration 10 --sensors 500 --output bench.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from array import array
+from collections import deque
+
+
+def _prepare_environment(data_dir):
+    """Configuration minimale pour importer mqtt/discobot sans broker ni token"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    defaults = {
+        "MQTT_BROKER": "127.0.0.1",
+        "MQTT_PORT": "1",
+        # Pas de thread de connexion : le faux client remplace paho pendant toute la mesure
+        "MQTT_AUTOCONNECT": "false",
+        "BOT_CHANNEL": "0",
+        "LOG_LEVEL": "WARNING",
+        "METRICS_PORT": "0",
+        "SENSORS_CONFIG": os.path.join(here, "sensors.json"),
+        "TSDB_DIR": os.path.join(data_dir, "tsdb"),
+        "SNAPSHOT_PATH": os.path.join(data_dir, "snapshot.json"),
+        "ROLLUPS_PATH": os.path.join(data_dir, "rollups.json"),
+        "COMMANDS_HASH_PATH": os.path.join(data_dir, "commands.hash"),
+    }
+    for key, value in defaults.items():
+        os.environ.setdefault(key, value)
+
+
+class FakeMessage:
+    """Équivalent minimal de paho.mqtt.client.MQTTMessage"""
+    __slots__ = ("topic", "payload", "qos", "retain")
+
+    def __init__(self, topic, payload):
+        self.topic = topic
+        self.payload = payload
+        self.qos = 0
+        self.retain = False
+
+
+class FakeMessageInfo:
+    def __init__(self, mid):
+        self.mid = mid
+        self.rc = 0
+
+    def is_published(self):
+        return True
+
+    def wait_for_publish(self, timeout=None):
+        return True
+
+
+class FakeClient:
+    """Client MQTT simulé : enregistre les publications au lieu de les envoyer"""
+
+    def __init__(self):
+        self.published = []
+        self._mid = 0
+
+    def publish(self, topic, payload=None, qos=0, retain=False, properties=None):
+        self._mid += 1
+        self.published.append((topic, payload, qos))
+        return FakeMessageInfo(self._mid)
+
+    def subscribe(self, topic, qos=0, options=None, properties=None):
+        return 0, 1
+
+    def unsubscribe(self, topic, properties=None):
+        return 0, 1
+
+    def is_connected(self):
+        return True
+
+    def loop_stop(self):
+        pass
+
+    def disconnect(self, *args, **kwargs):
+        pass
+
+
+class SyntheticFeed:
+    """Générateur de messages synthétiques pour les familles zigbee2mqtt, zwave et nukihub"""
+
+    def __init__(self, sensors, dup_ratio=0.3, nuki_every=500, seed=42):
+        self.random = random.Random(seed)
+        self.dup_ratio = dup_ratio
+        self.nuki_every = nuki_every
+        self.sensors = sensors
+        self.values = [20.0] * len(sensors)
+        self.last_payloads = [None] * len(sensors)
+        self.lock_state = "locked"
+        self.count = 0
+
+    def next(self):
+        """Retourne (message, est_une_alerte)"""
+        self.count += 1
+        if self.nuki_every and self.count % self.nuki_every == 0:
+            self.lock_state = "unlocked" if self.lock_state == "locked" else "locked"
+            payload = json.dumps({"lock_state": self.lock_state, "trigger": "manual", "battery_critical": False})
+            return FakeMessage("nukihub/lock/json", payload.encode()), True
+
+        index = self.random.randrange(len(self.sensors))
+        topic, family = self.sensors[index]
+        previous = self.last_payloads[index]
+        if previous is not None and self.random.random() < self.dup_ratio:
+            return FakeMessage(topic, previous), False
+
+        self.values[index] += self.random.uniform(-0.2, 0.2)
+        value = round(self.values[index], 2)
+        if family == "zwave":
+            payload = {"time": int(time.time() * 1000), "value": value}
+        else:
+            payload = {"temperature": value, "humidity": self.random.randint(30, 70),
+                       "linkquality": self.random.randint(20, 255), "battery": 100}
+        raw = json.dumps(payload).encode()
+        self.last_payloads[index] = raw
+        return FakeMessage(topic, raw), False
+
+
+def register_synthetic_sensors(manager, count):
+    """Ajoute `count` capteurs synthétiques au registre et reconstruit l'index de routage"""
+    from registry import SensorEntry
+
+    sensors = dict(manager.sensors)
+    feed_topics = []
+    for i in range(count):
+        if i % 2:
+            topic, field, family = f"zwave/Bench_{i}/Bench_{i}_-_Oeil/49/0/Air_temperature", "value", "zwave"
+        else:
+            topic, field, family = f"zigbee2mqtt/Bench {i} - Temperature", "temperature", "zigbee"
+        key = f"bench{i}_t"
+        sensors[key] = SensorEntry(key, topic, field, "°C", "temperature", 0)
+        feed_topics.append((topic, family))
+    if not any(entry.kind == "lock" for entry in sensors.values()):
+        sensors["nuki"] = SensorEntry("nuki", "nukihub/lock/json", "lock_state", "", "lock", 1)
+    manager.sensors = sensors
+    manager.router = manager._make_router(sensors)
+    return feed_topics
+
+
+class DiscordSink:
+    """Transport Discord simulé : horodate l'arrivée de chaque message"""
+
+    def __init__(self, alert_times):
+        self.alert_times = alert_times
+        self.latencies = array("d")
+        self.received = 0
+
+    async def send_simple_message(self, message, channel_id=None):
+        arrival = time.perf_counter()
+        # Un message peut être un résumé regroupant plusieurs alertes
+        for _ in range(max(1, message.count("🔓"))):
+            self.received += 1
+            if self.alert_times:
+                self.latencies.append(arrival - self.alert_times.popleft())
+        return True
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(p / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def drive(manager, feed, rate, duration, ingest, alert_times):
+    """Boucle du faux broker : injecte les messages au débit demandé (0 = au maximum)"""
+    on_message = manager._on_message
+    perf_counter = time.perf_counter
+    sent = alerts = 0
+    start = perf_counter()
+    while True:
+        elapsed = perf_counter() - start
+        if elapsed >= duration:
+            break
+        target = int(elapsed * rate) + 1 if rate else sent + 1000
+        while sent < target:
+            msg, is_alert = feed.next()
+            if is_alert:
+                alerts += 1
+                alert_times.append(perf_counter())
+            t0 = perf_counter()
+            on_message(None, None, msg)
+            ingest.append(perf_counter() - t0)
+            sent += 1
+        if rate:
+            delay = sent / rate - (perf_counter() - start)
+            if delay > 0:
+                time.sleep(delay)
+    return sent, alerts, perf_counter() - start
+
+
+async def run_benchmark(args):
+    if args.tracemalloc:
+        tracemalloc.start()
+
+    import mqtt
+    import discobot
+
+    manager = mqtt.mqtt_manager
+    bot = discobot.discord_bot
+    manager.mqtt_client = FakeClient()
+
+    topics = register_synthetic_sensors(manager, args.sensors)
+    feed = SyntheticFeed(topics, dup_ratio=args.dup_ratio, nuki_every=args.nuki_every, seed=args.seed)
+
+    alert_times = deque()
+    sink = DiscordSink(alert_times)
+    bot.send_simple_message = sink.send_simple_message
+    bot._start_queue_processor()
+
+    ingest = array("d")
+    sent, alerts, elapsed = await asyncio.get_running_loop().run_in_executor(
+        None, drive, manager, feed, args.rate, args.duration, ingest, alert_times)
+
+    # Laisser le faux Discord recevoir les dernières alertes
+    deadline = time.perf_counter() + 5
+    while sink.received < alerts and time.perf_counter() < deadline:
+        await asyncio.sleep(0.01)
+
+    if bot.queue_task:
+        bot.queue_task.cancel()
+    peak = tracemalloc.get_traced_memory()[1] if args.tracemalloc else None
+    manager.disconnect()
+
+    report = {
+        "messages": sent,
+        "duration_s": round(elapsed, 3),
+        "throughput_msg_s": round(sent / elapsed, 1) if elapsed else None,
+        "duplicates_dropped": manager.duplicates_dropped,
+        "ingest_p50_us": _us(percentile(ingest, 50)),
+        "ingest_p99_us": _us(percentile(ingest, 99)),
+        "ingest_max_us": _us(max(ingest) if ingest else None),
+        "alerts_sent": alerts,
+        "alerts_received": sink.received,
+        "e2e_p50_ms": _ms(percentile(sink.latencies, 50)),
+        "e2e_p99_ms": _ms(percentile(sink.latencies, 99)),
+        "tracemalloc_peak_mb": round(peak / 1e6, 2) if peak is not None else None,
+        "max_rss_mb": _max_rss_mb(),
+    }
+    return report
+
+
+def _us(value):
+    return None if value is None else round(value * 1e6, 1)
+
+
+def _ms(value):
+    return None if value is None else round(value * 1e3, 3)
+
+
+def _max_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux : kilo-octets, macOS : octets
+    return round(rss / (1e6 if sys.platform == "darwin" else 1e3), 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Banc de mesure hors-ligne MQTT → Discord")
+    parser.add_argument("--rate", type=float, default=1000, help="messages/s injectés (0 = débit maximal)")
+    parser.add_argument("--duration", type=float, default=5, help="durée de l'injection en secondes")
+    parser.add_argument("--sensors", type=int, default=200, help="nombre de capteurs synthétiques")
+    parser.add_argument("--dup-ratio", type=float, default=0.3, help="part de republications identiques")
+    parser.add_argument("--nuki-every", type=int, default=500, help="un changement d'état du verrou tous les N messages")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--tracemalloc", action="store_true", help="mesurer le pic mémoire Python (plus lent)")
+    parser.add_argument("--output", help="fichier JSON où écrire le rapport")
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix="discobot-bench-")
+    _prepare_environment(data_dir)
+
+    report = asyncio.run(run_benchmark(args))
+
+    print("=" * 50)
+    print("📊 RAPPORT DE BENCHMARK")
+    print("=" * 50)
+    for key, value in report.items():
+        print(f"{key:>22}: {value}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"✓ Rapport écrit dans {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+import os
+import random
+import threading
+import time
+from collections import namedtuple
+
+import paho.mqtt.client as mqtt
+from dotenv import load_dotenv
+
+from logs import get_logger
+from metrics import metrics
+from mqtt_async import AsyncioTransport
+from outbox import OUTBOX_PATH, QUEUED, Outbox
+from supervisor import CONNECTED, ConnectionSupervisor
+
+load_dotenv(dotenv_path="config")
+
+logger = get_logger("broker")
+
+# "thread" : boucle réseau et reconnexions gérées par paho dans son propre thread (loop_start)
+# "asyncio" : socket pilotée par la boucle asyncio du bot Discord
+MQTT_TRANSPORT = os.getenv("MQTT_TRANSPORT", "thread").lower()
+
+# Brokers nommés : "zwave,zigbee,nuki" configurés par MQTT_<NOM>_BROKER, MQTT_<NOM>_PORT...
+# Sans MQTT_BROKERS, un seul broker "default" configuré par MQTT_BROKER / MQTT_PORT
+MQTT_BROKERS = os.getenv("MQTT_BROKERS", "")
+DEFAULT_BROKER = "default"
+
+# Délais (s) de reconnexion par défaut
+RECONNECT_MIN_DELAY = float(os.getenv("MQTT_RECONNECT_MIN", "1"))
+RECONNECT_MAX_DELAY = float(os.getenv("MQTT_RECONNECT_MAX", "120"))
+
+# Session persistante (false) : le broker garde les abonnements et met de côté les messages QoS 1/2
+# reçus pendant l'absence du bot ; elle exige un identifiant client fixe
+MQTT_CLEAN_SESSION = os.getenv("MQTT_CLEAN_SESSION", "true")
+# Identifiant client (vide : "discobot-<broker>" en session persistante, aléatoire sinon)
+MQTT_CLIENT_ID = os.getenv("MQTT_CLIENT_ID", "")
+KEEPALIVE = 60
+
+MQTT_PUBLISH = metrics.counter("mqtt_publish_total", "Publications MQTT", ("topic", "result"))
+MQTT_PUBLISH_SECONDS = metrics.histogram("mqtt_publish_seconds", "Durée d'appel de publish()")
+MQTT_PUBLISH_ACK_SECONDS = metrics.histogram("mqtt_publish_ack_seconds", "Délai d'acquittement d'une publication QoS 1/2")
+
+# Paramètres de connexion d'un broker
+BrokerConfig = namedtuple("BrokerConfig", ["name", "host", "port", "username", "password", "transport",
+                                           "reconnect_min", "reconnect_max", "clean_session", "client_id"])
+
+
+def _flag(value):
+    return value.strip().lower() not in ("0", "false", "no", "off")
+
+
+def load_broker_configs():
+    """Liste des brokers configurés, dans l'ordre de MQTT_BROKERS (le premier est le broker par défaut)"""
+    names = [name.strip() for name in MQTT_BROKERS.split(",") if name.strip()]
+    if not names:
+        return [BrokerConfig(
+            name=DEFAULT_BROKER,
+            host=os.getenv("MQTT_BROKER"),
+            port=int(os.getenv("MQTT_PORT")),
+            username=os.getenv("MQTT_USER"),
+            password=os.getenv("MQTT_PASSWORD"),
+            transport=MQTT_TRANSPORT,
+            reconnect_min=RECONNECT_MIN_DELAY,
+            reconnect_max=RECONNECT_MAX_DELAY,
+            clean_session=_flag(MQTT_CLEAN_SESSION),
+            client_id=MQTT_CLIENT_ID,
+        )]
+
+    configs = []
+    for name in names:
+        prefix = f"MQTT_{name.upper()}_"
+        configs.append(BrokerConfig(
+            name=name,
+            host=os.getenv(prefix + "BROKER"),
+            port=int(os.getenv(prefix + "PORT", "1883")),
+            username=os.getenv(prefix + "USER", os.getenv("MQTT_USER")),
+            password=os.getenv(prefix + "PASSWORD", os.getenv("MQTT_PASSWORD")),
+            transport=os.getenv(prefix + "TRANSPORT", MQTT_TRANSPORT).lower(),
+            reconnect_min=float(os.getenv(prefix + "RECONNECT_MIN", RECONNECT_MIN_DELAY)),
+            reconnect_max=float(os.getenv(prefix + "RECONNECT_MAX", RECONNECT_MAX_DELAY)),
+            clean_session=_flag(os.getenv(prefix + "CLEAN_SESSION", MQTT_CLEAN_SESSION)),
+            client_id=os.getenv(prefix + "CLIENT_ID", MQTT_CLIENT_ID),
+        ))
+    return configs
+
+
+def _outbox_path(name):
+    """Fichier de la file hors-ligne d'un broker (suffixé par son nom, sauf pour le broker par défaut)"""
+    if not OUTBOX_PATH or name == DEFAULT_BROKER:
+        return OUTBOX_PATH
+    root, ext = os.path.splitext(OUTBOX_PATH)
+    return f"{root}-{name}{ext}"
+
+
+class BrokerConnection:
+    """Connexion à un broker : client paho, boucle réseau, file hors-ligne et suivi des acquittements propres"""
+
+    def __init__(self, config, on_message, topics):
+        self.config = config
+        self.name = config.name
+        # Fonction retournant la liste (topic, qos) à abonner sur ce broker
+        self.topics = topics
+        # Topics d'état abonnés à la demande (attentes de confirmation des commandes)
+        self.extra_topics = set()
+        self.client_id = config.client_id
+        if not self.client_id:
+            self.client_id = (f'python-mqtt-{config.name}-{random.randint(0, 1000)}' if config.clean_session
+                              else f"discobot-{config.name}")
+        # Transitions d'état et délais de reconnexion (gigue exponentielle)
+        self.supervisor = ConnectionSupervisor(config.name, config.reconnect_min, config.reconnect_max)
+        self._stopping = threading.Event()
+
+        # Publications faites pendant une déconnexion, rejouées à la reconnexion,
+        # et publications QoS 1/2 en attente d'acquittement (mid → (topic, perf_counter))
+        self.outbox = Outbox(path=_outbox_path(config.name))
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+
+        self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=self.client_id,
+                                  clean_session=config.clean_session)
+        self.client.on_connect = self._on_connect
+        self.client.on_disconnect = self._on_disconnect
+        self.client.on_connect_fail = self._on_connect_fail
+        self.client.on_message = on_message
+        self.client.on_publish = self._on_publish
+        self.client.username_pw_set(config.username, config.password)
+
+        self.asyncio_transport = None
+        if config.transport == "asyncio":
+            self.asyncio_transport = AsyncioTransport(self.client, self.supervisor)
+
+    def start(self):
+        """Démarre la boucle réseau paho dans son propre thread (connexion et reconnexions comprises)"""
+        if self.asyncio_transport is not None:
+            return
+        self.supervisor.connecting()
+        try:
+            # connect_async : un broker lent ou injoignable ne bloque ni le démarrage ni les autres
+            self.client.connect_async(self.config.host, self.config.port, KEEPALIVE)
+            self.client.loop_start()
+            logger.info("🔗 [%s] Connexion MQTT initiée vers %s:%s", self.name, self.config.host, self.config.port)
+        except Exception as e:
+            logger.error("❌ [%s] Erreur de connexion MQTT: %s", self.name, e)
+            self.supervisor.disconnected(e)
+
+    def _schedule_retry(self):
+        """Donne à paho le prochain délai de reconnexion, tiré par le superviseur (gigue exponentielle)
+
+        Appelé depuis le thread paho avant son attente : min = max = délai, la progression
+        exponentielle étant portée par le superviseur.
+        """
+        delay = self.supervisor.next_delay()
+        self.client.reconnect_delay_set(delay, delay)
+
+    async def start_asyncio(self):
+        """Connecte le client sur la boucle asyncio courante (mode transport asyncio)"""
+        if self.asyncio_transport is not None:
+            await self.asyncio_transport.start(self.config.host, self.config.port, KEEPALIVE)
+
+    def stop(self):
+        self._stopping.set()
+        if self.asyncio_transport is not None:
+            self.asyncio_transport.stop()
+        else:
+            self.client.disconnect()
+            self.client.loop_stop()
+        self.supervisor.stopped()
+
+    def is_connected(self):
+        return self.client.is_connected()
+
+    def subscribe(self, topics):
+        """Abonne une liste de (topic, qos) si la connexion est établie (sinon fait par _on_connect)"""
+        if topics and self.is_connected():
+            self.client.subscribe(topics)
+
+    def unsubscribe(self, topics):
+        if topics and self.is_connected():
+            self.client.unsubscribe(topics)
+
+    def _on_connect(self, client, userdata, flags, reason_code, properties=None):
+        logger.info("[%s] MQTT connecté avec le code %s", self.name, reason_code)
+        if reason_code.is_failure:
+            # paho ferme ensuite la connexion : _on_disconnect reprend la raison du refus
+            self.supervisor.last_error = str(reason_code)
+            return
+        self.supervisor.connected(flags.session_present)
+        # Un seul paquet SUBSCRIBE pour tous les topics du broker, avec la QoS de chacun
+        topics = self.topics()
+        topics += [(topic, 1) for topic in self.extra_topics]
+        if topics:
+            client.subscribe(topics)
+        logger.info("✓ [%s] Abonné à %d topics%s", self.name, len(topics),
+                    " (session reprise)" if flags.session_present else "")
+        self._flush_outbox()
+
+    def _on_disconnect(self, client, userdata, flags, reason_code, properties=None):
+        if self._stopping.is_set():
+            return
+        logger.warning("⚠️ [%s] MQTT déconnecté: %s", self.name, reason_code)
+        # Refus pendant la connexion : la raison a déjà été relevée par _on_connect
+        self.supervisor.disconnected(reason_code if self.supervisor.state == CONNECTED else None)
+        if self.asyncio_transport is None:
+            self._schedule_retry()
+
+    def _on_connect_fail(self, client, userdata):
+        """Broker injoignable (socket non ouverte) : paho attend puis retente"""
+        if self._stopping.is_set():
+            return
+        self.supervisor.disconnected("broker injoignable")
+        self._schedule_retry()
+
+    def _flush_outbox(self):
+        """Rejoue dans l'ordre les commandes mises en attente pendant la déconnexion"""
+        with self.outbox.lock:
+            pending = self.outbox.drain()
+            for item in pending:
+                self._publish(item.topic, item.payload, item.qos, item.retain, item.ttl)
+        if pending:
+            logger.info("📤 [%s] %d commandes en attente rejouées", self.name, len(pending))
+
+    def _on_publish(self, client, userdata, mid, reason_code=None, properties=None):
+        """Acquittement d'une publication (PUBACK/PUBCOMP, ou envoi effectif en QoS 0)"""
+        with self._inflight_lock:
+            pending = self._inflight.pop(mid, None)
+        if pending is not None:
+            MQTT_PUBLISH_ACK_SECONDS.observe(time.perf_counter() - pending[1])
+
+    def inflight(self):
+        return len(self._inflight)
+
+    def publish(self, topic, message, qos=0, retain=False, ttl=None):
+        """Publie un message ; retourne le MQTTMessageInfo de paho, QUEUED s'il est mis en attente
+        (rejoué à la reconnexion s'il a moins de `ttl` secondes), ou None s'il n'a pas été envoyé"""
+        try:
+            with self.outbox.lock:
+                # File non vide : passer derrière les commandes en attente pour garder l'ordre
+                if len(self.outbox) or not self.is_connected():
+                    if ttl == 0:
+                        MQTT_PUBLISH.inc(topic, "dropped")
+                        logger.warning("❌ [%s] Broker MQTT déconnecté, commande non envoyée: %s", self.name, topic)
+                        return None
+                    self.outbox.push(topic, message, qos, retain, ttl)
+                    MQTT_PUBLISH.inc(topic, "queued")
+                    logger.warning("📥 [%s] Broker MQTT déconnecté, message mis en attente pour %s", self.name, topic)
+                    return QUEUED
+                info = self._publish(topic, message, qos, retain, ttl)
+            if info is not None and info is not QUEUED:
+                logger.info("📤 [%s] Message publié sur %s (QoS %d): %s", self.name, topic, qos, message)
+            return info
+        except Exception as e:
+            MQTT_PUBLISH.inc(topic, "error")
+            logger.error("❌ [%s] Erreur lors de la publication: %s", self.name, e)
+            return None
+
+    def _publish(self, topic, message, qos, retain, ttl=None):
+        """Appel à paho (avec le verrou de la file) ; remet le message en attente si la connexion est perdue"""
+        with MQTT_PUBLISH_SECONDS.time():
+            info = self.client.publish(topic, message, qos=qos, retain=retain)
+        if info.rc == mqtt.MQTT_ERR_NO_CONN and qos == 0:
+            # En QoS 1/2, paho garde lui-même le message et le renverra à la reconnexion
+            if ttl == 0:
+                MQTT_PUBLISH.inc(topic, "dropped")
+                return None
+            self.outbox.push(topic, message, qos, retain, ttl)
+            MQTT_PUBLISH.inc(topic, "queued")
+            return QUEUED
+        if qos:
+            with self._inflight_lock:
+                self._inflight[info.mid] = (topic, time.perf_counter())
+            # Acquittement reçu avant l'enregistrement du mid
+            if info.is_published():
+                self._on_publish(self.client, None, info.mid)
+        MQTT_PUBLISH.inc(topic, "ok")
+        return info
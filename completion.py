@@ -0,0 +1,77 @@
+import unicodedata
+from bisect import bisect_left
+
+# Nombre maximal de suggestions acceptées par Discord
+MAX_CHOICES = 25
+
+DOOR_ACTIONS = ["lock", "unlock", "verrouiller", "deverrouiller", "status", "statut"]
+LIGHT_STATES = ["on", "off"]
+
+
+def normalize(text):
+    """Minuscules sans accents, pour comparer ce que tape l'utilisateur aux noms du registre"""
+    text = unicodedata.normalize("NFKD", text.lower().strip())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+class PrefixIndex:
+    """Index triés des noms et du début de chacun de leurs mots : recherche par préfixe en O(log n + k)"""
+
+    def __init__(self, names):
+        self.names = sorted(set(names))
+        full = []
+        words = []
+        for name in self.names:
+            normalized = normalize(name)
+            full.append((normalized, name))
+            # "cuisine_congelateur" est aussi trouvé en tapant "cong"
+            for i, char in enumerate(normalized):
+                if char in "_- " and i + 1 < len(normalized):
+                    words.append((normalized[i + 1:], name))
+        self._full = sorted(full)
+        self._words = sorted(words)
+
+    def search(self, text, limit=MAX_CHOICES):
+        """Noms commençant par `text`, puis noms dont un mot commence par `text`"""
+        if not text:
+            return self.names[:limit]
+        prefix = normalize(text)
+        results = []
+        seen = set()
+        for entries in (self._full, self._words):
+            # Parcours à partir du premier candidat, arrêté dès que le préfixe ne correspond plus
+            for i in range(bisect_left(entries, (prefix,)), len(entries)):
+                key, name = entries[i]
+                if not key.startswith(prefix) or len(results) >= limit:
+                    break
+                if name not in seen:
+                    seen.add(name)
+                    results.append(name)
+        return results
+
+
+class CompletionIndex:
+    """Index d'autocomplétion des pièces, reconstruit uniquement quand le registre ou l'ensemble
+    des capteurs connus change"""
+
+    def __init__(self):
+        self._version = None
+        self.rooms = PrefixIndex([])
+        self.lights = PrefixIndex([])
+        self.door_actions = PrefixIndex(DOOR_ACTIONS)
+        self.light_states = PrefixIndex(LIGHT_STATES)
+
+    def refresh(self, mqtt_manager):
+        """Reconstruit les index si le registre a changé ou si de nouvelles clés sont apparues"""
+        values = mqtt_manager.state.snapshot().values
+        # Les clés de l'état ne sont jamais supprimées : leur nombre suffit à détecter une nouvelle clé
+        version = (id(mqtt_manager), mqtt_manager.registry_version, len(values))
+        if version == self._version:
+            return self
+        # Clés du registre, plus celles résolues depuis un topic joker ("zb_{}_t" → "zb_salon_t")
+        keys = [key for key in mqtt_manager.sensors if "{}" not in key]
+        keys.extend(values)
+        self.rooms = PrefixIndex(key[:-2] for key in keys if key.endswith("_t"))
+        self.lights = PrefixIndex(mqtt_manager.get_actuators("light"))
+        self._version = version
+        return self
@@ -1,16 +1,54 @@
 import asyncio
+import hashlib
 import os
 import json
-import queue
+import threading
 import time
+from collections import deque
 from datetime import datetime, timedelta
 
 import discord
+from discord import app_commands
 from dotenv import load_dotenv
 from discord.ext import commands
 
+from completion import CompletionIndex
+from files import write_atomic
+from history import parse_window
+from logs import get_logger
+from metrics import metrics
+from outbox import QUEUED
+from routing import NotificationRouter
+from scheduler import SendScheduler
+from supervisor import BACKOFF, CONNECTED, CONNECTING, STOPPED
+
 load_dotenv(dotenv_path="config")
 
+logger = get_logger("discord")
+
+DISCORD_QUEUE_WAIT = metrics.histogram("discord_queue_wait_seconds", "Attente d'un message dans la queue sortante")
+DISCORD_SEND_SECONDS = metrics.histogram("discord_send_seconds", "Latence REST d'un envoi Discord")
+DISCORD_SEND = metrics.counter("discord_send_total", "Messages Discord envoyés", ("result",))
+COMMAND_SECONDS = metrics.histogram("discord_command_seconds", "Temps de traitement des commandes slash", ("command",))
+ACTUATION_SECONDS = metrics.histogram("actuation_rtt_seconds", "Délai entre la commande et la confirmation d'état",
+                                      ("device",))
+COMMANDS = metrics.counter("discord_commands_total", "Commandes slash traitées", ("command", "result"))
+
+# Âge (s) au-delà duquel une valeur est affichée comme ancienne
+STALE_AFTER = 15 * 60
+
+# Délai maximal (s) d'attente de la confirmation d'état après une commande /door ou /light
+EXPECT_TIMEOUT = float(os.getenv("EXPECT_TIMEOUT", "15"))
+# Clé du verrou dans les actionneurs du registre (topics de commande et d'état)
+DOOR_ACTUATOR = "porte"
+
+# Durée de vie (s) des noms d'utilisateurs résolus, et nombre maximal d'appels REST simultanés
+USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", "3600"))
+USER_FETCH_CONCURRENCY = int(os.getenv("USER_FETCH_CONCURRENCY", "5"))
+
+# Empreinte du dernier arbre de commandes synchronisé
+COMMANDS_HASH_PATH = os.getenv("COMMANDS_HASH_PATH", "data/commands.hash")
+
 class DiscordBot:
     def __init__(self):
         self.intents = discord.Intents.default()
@@ -26,10 +64,29 @@ class DiscordBot:
         # Référence vers le gestionnaire MQTT (sera définie plus tard)
         self.mqtt_manager = None
 
-        # Queue pour les messages externes (MQTT)
-        self.message_queue = queue.Queue()
+        # Queue pour les messages externes (MQTT), créée sur la boucle asyncio du bot
+        self.message_queue = None
+        self.loop = None
+        # Messages reçus avant que la boucle soit prête
+        self._pending_messages = deque()
+        self._queue_lock = threading.Lock()
         self.queue_processor_started = False
         self.queue_task = None  # Référence vers la tâche du processeur
+        # Table de routage (capteur / catégorie → canal) et une tâche d'envoi par canal,
+        # avec limite de débit, regroupement des rafales et suppression des doublons
+        self.routes = NotificationRouter(self.default_channel_id)
+        self.scheduler = SendScheduler(self._send_scheduled)
+
+        # Cache des canaux résolus (évite un appel REST fetch_channel à chaque envoi)
+        self._channel_cache = {}
+        # Index d'autocomplétion des paramètres, reconstruit quand le registre change
+        self.completions = CompletionIndex()
+
+        # Cache des noms d'utilisateurs : id → (nom ou None si inconnu, expiration)
+        self._user_cache = {}
+        self._user_fetch_semaphore = None
+
+        metrics.gauge("discord_queue_depth", "Messages en attente d'envoi vers Discord", self.queue_depth)
 
         # Configuration des utilisateurs autorisés
         self.authorized_users = self._load_authorized_users()
@@ -107,26 +164,170 @@ class DiscordBot:
             return False
         return True
 
+    @staticmethod
+    def _format_temp_stats(piece_name, stats):
+        """Formate les statistiques d'historique d'un capteur"""
+        trend = stats["trend"]
+        arrow = "↗️" if trend > 0.05 else "↘️" if trend < -0.05 else "➡️"
+        return (f"• {piece_name.capitalize()}: min {stats['min']:.1f}°C / max {stats['max']:.1f}°C / "
+                f"moy {stats['mean']:.1f}°C {arrow} {trend:+.2f}°C/h ({stats['count']} mesures)")
+
+    @staticmethod
+    def _format_age(seconds):
+        """Formate l'âge d'une valeur (ex: 'il y a 5 min')"""
+        if seconds < 60:
+            return "à l'instant"
+        if seconds < 3600:
+            return f"il y a {int(seconds // 60)} min"
+        if seconds < 86400:
+            return f"il y a {int(seconds // 3600)}h"
+        return f"il y a {int(seconds // 86400)}j"
+
+    def _age_suffix(self, age):
+        """Indique l'âge d'une valeur ancienne (ex: restaurée au démarrage) ou sans horodatage
+        (ex: message retenu reçu sans mesure préalable)"""
+        if age is None:
+            return " *(âge inconnu)*"
+        if age < STALE_AFTER:
+            return ""
+        return f" *({self._format_age(age)})*"
+
+    @staticmethod
+    def _temperature_lines(snapshot):
+        """Lignes (texte, horodatage) de la liste des températures, pour une version de l'état"""
+        lines = []
+        for capteur, temp in snapshot.values.items():
+            if capteur.endswith("_t"):
+                piece_name = capteur.replace("_t", "")
+                lines.append((f"• {piece_name.capitalize()}: {temp}°C", snapshot.timestamps.get(capteur)))
+        return tuple(lines)
+
+    def _connection_lines(self):
+        """Une ligne par broker : état de la connexion, durée de la coupure et dernière erreur"""
+        now = time.time()
+        supervisors = self.mqtt_manager.connection_status()
+        lines = []
+        for name, supervisor in supervisors.items():
+            prefix = f"• {name}: " if len(supervisors) > 1 else "• "
+            if supervisor.state == CONNECTED:
+                line = f"✅ connecté {self._format_age(now - supervisor.since)}"
+                if supervisor.session_present:
+                    line += " (session reprise)"
+            else:
+                if supervisor.state == BACKOFF and supervisor.next_attempt:
+                    line = (f"⏳ nouvel essai dans {max(0, int(supervisor.next_attempt - now))}s "
+                            f"(tentative {supervisor.backoff.attempts})")
+                elif supervisor.state == CONNECTING:
+                    line = "🔄 connexion en cours"
+                elif supervisor.state == STOPPED:
+                    line = "⏹️ arrêté"
+                else:
+                    line = "❌ déconnecté"
+                if supervisor.down_since:
+                    line += f", coupé {self._format_age(now - supervisor.down_since)}"
+                if supervisor.last_error:
+                    line += f" — {supervisor.last_error}"
+            lines.append(prefix + line)
+        return "\n".join(lines)
+
+    @staticmethod
+    def _status_lines(snapshot):
+        """Aperçu des dernières valeurs pour /mqtt_status, pour une version de l'état"""
+        lines = []
+        for capteur, temp in list(snapshot.values.items())[:5]:
+            if capteur.endswith("_t"):
+                piece_name = capteur.replace("_t", "")
+                lines.append(f"• {piece_name}: {temp}°C\n")
+        return "".join(lines)
+
+    def _door(self):
+        """Actionneur du verrou et capteur recevant son état : (None, None) si l'un des deux manque"""
+        actuator = self.mqtt_manager.get_actuator("lock", DOOR_ACTUATOR)
+        sensor = self.mqtt_manager.state_sensor(actuator) if actuator is not None else None
+        if sensor is None:
+            return None, None
+        return actuator, sensor
+
+    def _completions(self):
+        """Index d'autocomplétion à jour avec le registre MQTT et les capteurs connus"""
+        if self.mqtt_manager is None:
+            return self.completions
+        return self.completions.refresh(self.mqtt_manager)
+
+    @staticmethod
+    def _choices(index, current):
+        """Suggestions Discord pour la saisie en cours"""
+        return [app_commands.Choice(name=name, value=name) for name in index.search(current)]
+
     def set_mqtt_manager(self, mqtt_manager):
         """Configure la référence vers le gestionnaire MQTT"""
         self.mqtt_manager = mqtt_manager
         # Configurer le callback Discord dans MQTT
+        mqtt_manager.notifier = self.send_message_sync
         print("✓ Gestionnaire MQTT configuré")
 
-    def send_message_sync(self, message, channel_id=None):
-        """Méthode synchrone pour envoyer un message Discord depuis MQTT"""
+    def send_message_sync(self, message, channel_id=None, category=None, key=None):
+        """Méthode synchrone pour envoyer un message Discord depuis MQTT (thread-safe)
+
+        Sans canal explicite, le canal est choisi par la table de routage selon le capteur `key`
+        ou la catégorie (ex: "security" pour le verrou, prioritaire sur les autres notifications).
+        """
         try:
-            self.message_queue.put((message, channel_id))
-            print(f"📧 Message ajouté à la queue Discord: {message}")
+            if channel_id is None:
+                channel_id = self.routes.route(category, key)
+            item = (message, channel_id, self.routes.is_priority(category), time.perf_counter())
+            with self._queue_lock:
+                loop = self.loop
+                if loop is None:
+                    # Boucle pas encore prête : le message sera transféré au démarrage du processeur
+                    self._pending_messages.append(item)
+                    logger.debug("📧 Message mis en attente (bot non prêt): %s", message)
+                    return
+            if self._on_loop_thread(loop):
+                # Déjà sur la boucle (transport MQTT asyncio) : pas de passage inter-thread
+                self.message_queue.put_nowait(item)
+            else:
+                # Réveille la boucle uniquement quand un message arrive
+                loop.call_soon_threadsafe(self.message_queue.put_nowait, item)
+            logger.debug("📧 Message ajouté à la queue Discord: %s", message)
         except Exception as e:
-            print(f"❌ Erreur ajout queue Discord: {e}")
+            logger.error("❌ Erreur ajout queue Discord: %s", e)
+
+    @staticmethod
+    def _on_loop_thread(loop):
+        """Indique si l'appelant s'exécute sur la boucle `loop`"""
+        try:
+            return asyncio.get_running_loop() is loop
+        except RuntimeError:
+            return False
+
+    def queue_depth(self):
+        """Nombre de messages en attente d'envoi"""
+        depth = len(self._pending_messages) + self.scheduler.pending()
+        if self.message_queue is not None:
+            depth += self.message_queue.qsize()
+        return depth
+
+    def _record_command(self, interaction, name, result):
+        """Enregistre la durée de traitement d'une commande slash, depuis sa création côté Discord
+        (horodatage de l'interaction, indépendant de l'ordre des événements du bot)"""
+        elapsed = (discord.utils.utcnow() - interaction.created_at).total_seconds()
+        COMMAND_SECONDS.observe(max(0.0, elapsed), name)
+        COMMANDS.inc(name, result)
 
     def _start_queue_processor(self):
         """Démarre le processeur de queue si pas encore fait"""
-        if not self.queue_processor_started and hasattr(self.bot, 'loop') and self.bot.loop:
+        if not self.queue_processor_started:
             self.queue_processor_started = True
             # Créer la tâche et stocker la référence
             try:
+                loop = asyncio.get_running_loop()
+                with self._queue_lock:
+                    self.message_queue = asyncio.Queue()
+                    # Transférer les messages reçus avant que le bot soit prêt
+                    while self._pending_messages:
+                        self.message_queue.put_nowait(self._pending_messages.popleft())
+                    self.loop = loop
                 self.queue_task = asyncio.create_task(self._process_message_queue())
                 print("✓ Processeur de queue démarré")
             except Exception as e:
@@ -134,43 +335,55 @@ class DiscordBot:
                 self.queue_processor_started = False
 
     async def _process_message_queue(self):
-        """Traite les messages de la queue en arrière-plan"""
+        """Traite les messages de la queue en arrière-plan, sans attente active"""
         print("🔄 Processeur de queue en cours d'exécution...")
         while True:
             try:
-                # Vérifier s'il y a des messages dans la queue
-                try:
-                    message, channel_id = self.message_queue.get_nowait()
-                    await self.send_simple_message(message, channel_id)
-                    self.message_queue.task_done()
-                except queue.Empty:
-                    pass
-
-                # Attendre un peu avant de vérifier à nouveau
-                await asyncio.sleep(0.1)
+                # Bloque sans réveil tant qu'aucun message n'arrive
+                batch = [await self.message_queue.get()]
+                # Vider d'un coup les messages arrivés en rafale
+                while not self.message_queue.empty():
+                    batch.append(self.message_queue.get_nowait())
+
+                # Répartition sans attente vers la tâche d'envoi de chaque canal
+                for message, channel_id, priority, enqueued_at in batch:
+                    DISCORD_QUEUE_WAIT.observe(time.perf_counter() - enqueued_at)
+                    try:
+                        self.scheduler.submit(message, channel_id, priority)
+                    finally:
+                        self.message_queue.task_done()
 
             except asyncio.CancelledError:
+                self.scheduler.stop()
                 print("🛑 Processeur de queue arrêté")
                 break
             except Exception as e:
-                print(f"❌ Erreur processeur queue: {e}")
+                logger.error("❌ Erreur processeur queue: %s", e)
                 await asyncio.sleep(1)
 
+    async def _send_scheduled(self, message, channel_id):
+        """Envoi effectif d'une notification planifiée par le scheduler"""
+        await self.send_simple_message(message, channel_id)
+
     async def send_simple_message(self, message, channel_id=None):
         """Envoie un message simple sur Discord"""
         try:
             if channel_id is None:
                 channel_id = self.default_channel_id
-            channel = await self.bot.fetch_channel(channel_id)
+            channel = await self.resolve_channel(channel_id)
             if channel:
-                await channel.send(message)
-                print(f"📧 Message envoyé: {message}")
+                with DISCORD_SEND_SECONDS.time():
+                    await channel.send(message)
+                DISCORD_SEND.inc("ok")
+                logger.info("📧 Message envoyé: %s", message)
                 return True
             else:
-                print(f"❌ Canal {channel_id} non trouvé")
+                DISCORD_SEND.inc("no_channel")
+                logger.error("❌ Canal %s non trouvé", channel_id)
                 return False
         except Exception as e:
-            print(f"❌ Erreur envoi message: {e}")
+            DISCORD_SEND.inc("error")
+            logger.error("❌ Erreur envoi message: %s", e)
             return False
 
     def _setup_events(self):
@@ -186,7 +399,7 @@ class DiscordBot:
 
             # Initialiser le canal par défaut maintenant que le bot est connecté
             try:
-                channel = await self.bot.fetch_channel(self.default_channel_id)
+                channel = await self.resolve_channel(self.default_channel_id)
                 if channel:
                     print(f"✓ Canal par défaut configuré: {channel.name} ({channel.id})")
                 else:
@@ -197,17 +410,20 @@ class DiscordBot:
             for guild in self.bot.guilds:
                 print(f"  - {guild.name} (ID: {guild.id})")
 
-            try:
-                # Synchroniser les commandes slash
-                synced = await self.bot.tree.sync()
-                print(f"✓ {len(synced)} commandes slash synchronisées globalement")
+            # Synchroniser les commandes slash uniquement si l'arbre a changé
+            await self.sync_commands()
+
+        @self.bot.event
+        async def on_guild_channel_delete(channel):
+            self.invalidate_channel(channel.id)
 
-                # Afficher les commandes synchronisées
-                for cmd in synced:
-                    print(f"  - /{cmd.name}: {cmd.description}")
+        @self.bot.event
+        async def on_guild_channel_update(before, after):
+            self.invalidate_channel(after.id)
 
-            except Exception as e:
-                print(f"❌ Erreur lors de la synchronisation des commandes: {e}")
+        @self.bot.event
+        async def on_private_channel_delete(channel):
+            self.invalidate_channel(channel.id)
 
         @self.bot.event
         async def on_interaction(interaction):
@@ -215,6 +431,10 @@ class DiscordBot:
             if interaction.type == discord.InteractionType.application_command:
                 print(f"  - Commande: /{interaction.data.get('name', 'inconnue')}")
 
+        @self.bot.event
+        async def on_app_command_completion(interaction, command):
+            self._record_command(interaction, command.name, "ok")
+
         @self.bot.event
         async def on_message(message):
             # Ignorer ses propres messages
@@ -231,6 +451,8 @@ class DiscordBot:
         @self.tree.error
         async def on_app_command_error(interaction: discord.Interaction, error: discord.app_commands.AppCommandError):
             print(f"❌ Erreur commande /{interaction.command}: {error}")
+            name = interaction.command.name if interaction.command else "inconnue"
+            self._record_command(interaction, name, "error")
             try:
                 if not interaction.response.is_done():
                     await interaction.response.send_message("❌ Une erreur s'est produite.", ephemeral=True)
@@ -360,7 +582,7 @@ class DiscordBot:
                                                         ephemeral=True)
 
                 # Puis envoyer l'embed dans le canal par défaut
-                channel = await self.bot.fetch_channel(self.default_channel_id)
+                channel = await self.resolve_channel(self.default_channel_id)
                 if channel:
                     await channel.send(embed=embed)
                     print(f"✓ Informations du bot envoyées dans {channel.name} par {interaction.user}")
@@ -385,41 +607,103 @@ class DiscordBot:
             print(f"✓ Commande /test exécutée par {interaction.user}")
 
         @self.tree.command(name="temp", description="Affiche les températures")
-        async def temp(interaction: discord.Interaction, piece: str = None):
-            """Affiche les températures des capteurs MQTT"""
+        async def temp(interaction: discord.Interaction, piece: str = None, window: str = None):
+            """Affiche les températures des capteurs MQTT, éventuellement sur une fenêtre (1h, 24h...)"""
             if not await self.check_authorization(interaction):
                 return
 
-            print(f"✓ Commande /temp exécutée par {interaction.user} (pièce: {piece})")
+            print(f"✓ Commande /temp exécutée par {interaction.user} (pièce: {piece}, fenêtre: {window})")
 
             if not self.mqtt_manager:
                 await interaction.response.send_message("❌ MQTT non configuré")
                 return
 
-            dico_valeurs = self.mqtt_manager.dico_valeurs
+            # Snapshot immuable : aucune mise à jour MQTT ne peut le modifier pendant la lecture
+            state = self.mqtt_manager.state
+            snapshot = state.snapshot()
+            dico_valeurs = snapshot.values
+
+            if window:
+                try:
+                    seconds = parse_window(window)
+                except ValueError:
+                    await interaction.response.send_message(
+                        f"❌ Fenêtre '{window}' invalide. Exemples: `1h`, `24h`", ephemeral=True)
+                    return
+                keys = [f"{piece.lower()}_t"] if piece else sorted(k for k in dico_valeurs if k.endswith("_t"))
+                lines = []
+                for key in keys:
+                    stats = self.mqtt_manager.sensor_stats(key, seconds)
+                    if stats:
+                        lines.append(self._format_temp_stats(key.replace("_t", ""), stats))
+                if lines:
+                    message = f"🌡️ **Températures sur {window}:**\n" + "\n".join(lines)
+                else:
+                    message = f"❌ Aucun historique disponible sur {window}"
+                await interaction.response.send_message(message)
+                return
 
             if piece:
                 # Température d'une pièce spécifique
                 key = f"{piece.lower()}_t"
                 temp = dico_valeurs.get(key)
                 if temp:
-                    await interaction.response.send_message(f"🌡️ Température {piece}: {temp}°C")
+                    timestamp = snapshot.timestamps.get(key)
+                    age = None if timestamp is None else time.time() - timestamp
+                    await interaction.response.send_message(f"🌡️ Température {piece}: {temp}°C{self._age_suffix(age)}")
                 else:
-                    pieces_disponibles = [k.replace("_t", "") for k in dico_valeurs.keys()]
+                    pieces_disponibles = self._completions().rooms.names
                     message = f"❌ Pièce '{piece}' non trouvée.\nPièces disponibles: {', '.join(pieces_disponibles)}"
                     await interaction.response.send_message(message)
             else:
                 # Toutes les températures
                 if dico_valeurs:
+                    # Lignes recalculées uniquement quand l'état change, seul l'âge est calculé ici
+                    now = time.time()
                     message = "🌡️ **Températures actuelles:**\n"
-                    for capteur, temp in dico_valeurs.items():
-                        if capteur.endswith("_t"):
-                            piece_name = capteur.replace("_t", "")
-                            message += f"• {piece_name.capitalize()}: {temp}°C\n"
+                    for line, timestamp in state.view("temperature_lines", self._temperature_lines):
+                        age = None if timestamp is None else now - timestamp
+                        message += f"{line}{self._age_suffix(age)}\n"
                     await interaction.response.send_message(message)
                 else:
                     await interaction.response.send_message("❌ Aucune donnée de température disponible")
 
+        @temp.autocomplete("piece")
+        async def temp_piece_autocomplete(interaction: discord.Interaction, current: str):
+            return self._choices(self._completions().rooms, current)
+
+        @self.tree.command(name="temp_resume", description="Résumé quotidien des températures d'une pièce")
+        async def temp_resume(interaction: discord.Interaction, piece: str, jours: int = 7):
+            """Affiche min/max/moyenne jour par jour à partir des agrégats"""
+            if not await self.check_authorization(interaction):
+                return
+
+            print(f"✓ Commande /temp_resume exécutée par {interaction.user} (pièce: {piece}, jours: {jours})")
+
+            if not self.mqtt_manager:
+                await interaction.response.send_message("❌ MQTT non configuré")
+                return
+
+            if not self.mqtt_manager.rollups_ready():
+                await interaction.response.send_message("⏳ Agrégats en cours de rechargement, réessayez dans un instant")
+                return
+
+            jours = max(1, min(jours, 31))
+            rows = self.mqtt_manager.rollups.daily_summary(f"{piece.lower()}_t", jours)
+            if not rows:
+                await interaction.response.send_message(f"❌ Aucun historique pour '{piece}'")
+                return
+
+            message = f"📅 **Résumé {piece} sur {jours} jour(s):**\n"
+            for start, minimum, maximum, mean in rows:
+                day = datetime.fromtimestamp(start).strftime("%d/%m")
+                message += f"• {day}: min {minimum:.1f}°C / max {maximum:.1f}°C / moy {mean:.1f}°C\n"
+            await interaction.response.send_message(message)
+
+        @temp_resume.autocomplete("piece")
+        async def temp_resume_piece_autocomplete(interaction: discord.Interaction, current: str):
+            return self._choices(self._completions().rooms, current)
+
         @self.tree.command(name="mqtt_status", description="Statut de la connexion MQTT")
         async def mqtt_status(interaction: discord.Interaction):
             """Affiche le statut de la connexion MQTT"""
@@ -434,15 +718,14 @@ class DiscordBot:
 
             try:
                 status = "✅ Connecté" if self.mqtt_manager.is_connected() else "❌ Déconnecté"
-                nb_capteurs = len(self.mqtt_manager.dico_valeurs)
+                state = self.mqtt_manager.state
+                nb_capteurs = len(state.snapshot().values)
                 message = f"**Statut MQTT:** {status}\n**Capteurs actifs:** {nb_capteurs}"
+                message += "\n**Connexion:**\n" + self._connection_lines()
 
-                if self.mqtt_manager.dico_valeurs:
+                if nb_capteurs:
                     message += "\n\n**Dernières valeurs:**\n"
-                    for capteur, temp in list(self.mqtt_manager.dico_valeurs.items())[:5]:
-                        if capteur.endswith("_t"):
-                            piece_name = capteur.replace("_t", "")
-                            message += f"• {piece_name}: {temp}°C\n"
+                    message += state.view("status_lines", self._status_lines)
 
                 await interaction.response.send_message(message)
             except Exception as e:
@@ -469,10 +752,8 @@ class DiscordBot:
             # Normaliser les noms de pièces
             piece_norm = piece.lower().strip()
 
-            # Définir le topic MQTT en fonction de la pièce
-            topic_map = {
-                "salon": "zigbee2mqtt/lumieres_salon/set",
-            }
+            # Topic MQTT de chaque pièce, issu du registre rechargeable à chaud
+            topic_map = self.mqtt_manager.get_actuators("light")
 
             # Vérifier si la pièce est valide
             if piece_norm not in topic_map:
@@ -482,18 +763,51 @@ class DiscordBot:
 
             # Obtenir le topic MQTT
             topic = topic_map[piece_norm]
+            actuator = self.mqtt_manager.get_actuator("light", piece_norm)
+            wanted = etat.upper()
+            emoji = "💡" if etat.lower() == "on" else "🌑"
 
             try:
+                await interaction.response.defer(thinking=True)
+                # Attente enregistrée avant la publication pour ne pas manquer l'écho d'état
+                confirmation = self.mqtt_manager.expect(
+                    actuator.state_topic, lambda data: str(data.get("state", "")).upper() == wanted)
+                started = time.perf_counter()
+
                 # Publier le message MQTT
                 payload = json.dumps({"state": etat.lower()})
-                self.mqtt_manager.publish_message(topic, payload)
-
-                # Répondre à l'utilisateur
-                emoji = "💡" if etat.lower() == "on" else "🌑"
-                await interaction.response.send_message(f"{emoji} Lumière {piece}: **{etat.upper()}**")
+                result = self.mqtt_manager.publish_message(topic, payload)
+                if result is None or result == QUEUED:
+                    confirmation.cancel()
+                    await interaction.edit_original_response(content=(
+                        f"⏳ Lumière {piece}: broker MQTT injoignable, commande **{wanted}** mise en attente "
+                        f"(envoyée à la reconnexion si elle n'a pas expiré)" if result == QUEUED else
+                        f"❌ Lumière {piece}: broker MQTT injoignable, commande **{wanted}** non envoyée"))
+                    return
+
+                # Répondre à l'utilisateur une fois l'état confirmé par l'appareil
+                try:
+                    await asyncio.wait_for(confirmation, EXPECT_TIMEOUT)
+                except asyncio.TimeoutError:
+                    await interaction.edit_original_response(
+                        content=f"⚠️ Lumière {piece}: commande **{wanted}** envoyée, "
+                                f"sans confirmation après {EXPECT_TIMEOUT:.0f}s")
+                    return
+                rtt = time.perf_counter() - started
+                ACTUATION_SECONDS.observe(rtt, "light")
+                await interaction.edit_original_response(
+                    content=f"{emoji} Lumière {piece}: **{wanted}** ✅ *confirmé en {rtt * 1000:.0f} ms*")
             except Exception as e:
                 print(f"❌ Erreur dans light: {e}")
-                await interaction.response.send_message("❌ Erreur lors de l'envoi de la commande MQTT", ephemeral=True)
+                await interaction.edit_original_response(content="❌ Erreur lors de l'envoi de la commande MQTT")
+
+        @light.autocomplete("piece")
+        async def light_piece_autocomplete(interaction: discord.Interaction, current: str):
+            return self._choices(self._completions().lights, current)
+
+        @light.autocomplete("etat")
+        async def light_etat_autocomplete(interaction: discord.Interaction, current: str):
+            return self._choices(self.completions.light_states, current)
 
         @self.tree.command(name="door", description="Contrôle du verrou de la porte")
         async def door(interaction: discord.Interaction, action: str):
@@ -517,9 +831,15 @@ class DiscordBot:
                 )
                 return
 
+            # Actionneur du verrou et capteur de son état, issus du registre rechargeable à chaud
+            actuator, lock_sensor = self._door()
+            if lock_sensor is None:
+                await interaction.response.send_message("❌ Verrou non configuré", ephemeral=True)
+                return
+
             # Gestion de la commande status
             if action_lower in ["status", "statut"]:
-                current_state = self.mqtt_manager.dico_valeurs.get("nuki", "unknown")
+                current_state = self.mqtt_manager.dico_valeurs.get(lock_sensor.key, "unknown")
                 if current_state == "unknown":
                     status_msg = "❓ **État inconnu**\nAucune donnée du verrou disponible"
                     emoji = "❓"
@@ -549,34 +869,66 @@ class DiscordBot:
                 action_fr = "verrouillage" if mqtt_action == "lock" else "déverrouillage"
                 emoji = "🔒" if mqtt_action == "lock" else "🔓"
 
-            # Topic MQTT pour le verrou Nuki
-            nuki_topic = "nukihub/lock/action"
+            # État publié par le verrou une fois l'action terminée
+            expected_state = "locked" if mqtt_action == "lock" else "unlocked"
             try:
-                # Construire le payload MQTT
-                payload = mqtt_action #json.dumps(mqtt_action)
-                # Publier le message MQTT
-                self.mqtt_manager.publish_message(nuki_topic, payload)
+                await interaction.response.defer(thinking=True)
                 # Obtenir l'état actuel pour comparaison
-                current_state = self.mqtt_manager.dico_valeurs.get("nuki", "unknown")
+                current_state = self.mqtt_manager.dico_valeurs.get(lock_sensor.key, "unknown")
                 current_status = ""
                 if current_state != "unknown":
                     current_status = f"\n*État précédent: {'🔒 verrouillée' if current_state == 'locked' else '🔓 déverrouillée'}*"
-                # Répondre à l'utilisateur
-                await interaction.response.send_message(
-                    f"{emoji} **Commande de {action_fr} envoyée**\n"
-                    f"Action: `{mqtt_action}`{current_status}\n\n"
-                    f"⏳ *Vérification de l'état en cours...*"
-                )
+                # Attente enregistrée avant la publication pour ne pas manquer l'écho d'état
+                confirmation = self.mqtt_manager.expect(
+                    actuator.state_topic, lambda data: data.get(lock_sensor.field) == expected_state)
+                started = time.perf_counter()
+                # Construire le payload MQTT
+                payload = mqtt_action #json.dumps(mqtt_action)
+                # Publier le message MQTT
+                result = self.mqtt_manager.publish_message(actuator.topic, payload)
+                if result is None or result == QUEUED:
+                    confirmation.cancel()
+                    if result == QUEUED:
+                        print(f"📥 Commande de {action_fr} de {interaction.user} mise en attente")
+                        await interaction.edit_original_response(
+                            content=f"⏳ **Broker MQTT injoignable : commande de {action_fr} mise en attente**\n"
+                                    f"Action: `{mqtt_action}`{current_status}\n\n"
+                                    f"*Elle sera envoyée à la reconnexion si elle n'a pas expiré*")
+                    else:
+                        await interaction.edit_original_response(
+                            content=f"❌ **Broker MQTT injoignable : commande de {action_fr} non envoyée**\n"
+                                    f"Action: `{mqtt_action}`{current_status}")
+                    return
                 # Log de sécurité
                 print(f"🔐 Commande de {action_fr} envoyée par {interaction.user} ({interaction.user.id})")
+
+                # Répondre à l'utilisateur une fois l'état confirmé par le verrou
+                try:
+                    await asyncio.wait_for(confirmation, EXPECT_TIMEOUT)
+                except asyncio.TimeoutError:
+                    await interaction.edit_original_response(
+                        content=f"⚠️ **Commande de {action_fr} envoyée, sans confirmation du verrou**\n"
+                                f"Action: `{mqtt_action}`{current_status}\n\n"
+                                f"*Aucun état `{expected_state}` reçu après {EXPECT_TIMEOUT:.0f}s*")
+                    return
+                rtt = time.perf_counter() - started
+                ACTUATION_SECONDS.observe(rtt, "nuki")
+                etat = "verrouillée" if expected_state == "locked" else "déverrouillée"
+                await interaction.edit_original_response(
+                    content=f"{emoji} **Porte {etat}** ✅\n"
+                            f"Action: `{mqtt_action}`{current_status}\n\n"
+                            f"*Confirmé par le verrou en {rtt:.1f}s*")
             except Exception as e:
                 print(f"❌ Erreur dans door: {e}")
-                await interaction.response.send_message(
-                    f"❌ **Erreur lors de l'envoi de la commande**\n"
-                    f"Impossible d'envoyer la commande de {action_fr}",
-                    ephemeral=True
+                await interaction.edit_original_response(
+                    content=f"❌ **Erreur lors de l'envoi de la commande**\n"
+                            f"Impossible d'envoyer la commande de {action_fr}"
                 )
 
+        @door.autocomplete("action")
+        async def door_action_autocomplete(interaction: discord.Interaction, current: str):
+            return self._choices(self.completions.door_actions, current)
+
         @self.tree.command(name="door_status", description="Affiche l'état du verrou de la porte")
         async def door_status(interaction: discord.Interaction):
             """Affiche l'état actuel du verrou Nuki"""
@@ -586,8 +938,12 @@ class DiscordBot:
             if not self.mqtt_manager:
                 await interaction.response.send_message("❌ MQTT non configuré", ephemeral=True)
                 return
+            actuator, lock_sensor = self._door()
+            if lock_sensor is None:
+                await interaction.response.send_message("❌ Verrou non configuré", ephemeral=True)
+                return
             try:
-                current_state = self.mqtt_manager.dico_valeurs.get("nuki", "unknown")
+                current_state = self.mqtt_manager.dico_valeurs.get(lock_sensor.key, "unknown")
                 # Créer un embed pour un affichage plus riche
                 if current_state == "locked":
                     embed = discord.Embed(
@@ -611,8 +967,10 @@ class DiscordBot:
                     )
                     embed.add_field(name="Statut", value="❓ Données indisponibles", inline=True)
                 # Ajouter des informations supplémentaires
-                embed.add_field(name="Topic MQTT", value="`nukihub/lock/json`", inline=True)
-                embed.add_field(name="Dernière mise à jour", value="Temps réel", inline=True)
+                embed.add_field(name="Topic MQTT", value=f"`{actuator.state_topic}`", inline=True)
+                age = self.mqtt_manager.value_age(lock_sensor.key)
+                embed.add_field(name="Dernière mise à jour",
+                                value=self._format_age(age) if age is not None else "Inconnue", inline=True)
                 # Footer
                 embed.set_footer(text="Utilisez /door [action] pour contrôler le verrou")
                 embed.timestamp = discord.utils.utcnow()
@@ -681,16 +1039,26 @@ class DiscordBot:
 
             if not self.authorized_users:
                 message = "ℹ️ **Aucun utilisateur autorisé configuré**\nToutes les commandes sont ouvertes à tous."
-            else:
-                message = f"👥 **Utilisateurs autorisés ({len(self.authorized_users)}):**\n"
-                for user_id in sorted(self.authorized_users):
-                    try:
-                        user = await self.bot.fetch_user(user_id)
-                        message += f"• {user.display_name} (`{user_id}`)\n"
-                    except:
-                        message += f"• Utilisateur inconnu (`{user_id}`)\n"
+                await interaction.response.send_message(message, ephemeral=True)
+                return
 
-            await interaction.response.send_message(message, ephemeral=True)
+            # La résolution des noms peut dépasser le délai de 3 s d'une interaction
+            await interaction.response.defer(ephemeral=True, thinking=True)
+            user_ids = sorted(self.authorized_users)
+            names = await self.resolve_user_names(user_ids, interaction.guild)
+
+            lines = [f"👥 **Utilisateurs autorisés ({len(user_ids)}):**"]
+            for user_id, name in zip(user_ids, names):
+                lines.append(f"• {name or 'Utilisateur inconnu'} (`{user_id}`)")
+
+            # Découpage sous la limite de 2000 caractères d'un message
+            message = ""
+            for line in lines:
+                if len(message) + len(line) + 1 > 2000:
+                    await interaction.followup.send(message, ephemeral=True)
+                    message = ""
+                message += line + "\n"
+            await interaction.followup.send(message, ephemeral=True)
 
     async def start(self):
         """Démarre le bot Discord"""
@@ -714,8 +1082,102 @@ class DiscordBot:
             await self.bot.close()
             print("✓ Bot Discord fermé")
 
+    def _command_tree_hash(self):
+        """Empreinte stable de l'arbre de commandes (noms, descriptions, paramètres)"""
+        payload = []
+        for cmd in sorted(self.tree.get_commands(), key=lambda c: c.name):
+            try:
+                payload.append(cmd.to_dict(self.tree))
+            except TypeError:
+                # Versions de discord.py où to_dict() ne prend pas l'arbre
+                payload.append(cmd.to_dict())
+        data = json.dumps({"application": getattr(self.bot, "application_id", None), "commands": payload}, sort_keys=True, default=str)
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+    def _read_commands_hash(self):
+        try:
+            with open(COMMANDS_HASH_PATH, "r", encoding="utf-8") as f:
+                return f.read().strip()
+        except OSError:
+            return None
+
+    def _write_commands_hash(self, value):
+        write_atomic(COMMANDS_HASH_PATH, value)
+
+    async def sync_commands(self, force=False):
+        """Synchronise les commandes slash si leur empreinte a changé (ou si force=True)"""
+        try:
+            tree_hash = self._command_tree_hash()
+            if not force and tree_hash == self._read_commands_hash():
+                print("✓ Commandes slash inchangées, synchronisation ignorée")
+                return None
+
+            synced = await self.bot.tree.sync()
+            self._write_commands_hash(tree_hash)
+            print(f"✓ {len(synced)} commandes slash synchronisées globalement")
+
+            # Afficher les commandes synchronisées
+            for cmd in synced:
+                print(f"  - /{cmd.name}: {cmd.description}")
+            return synced
+
+        except Exception as e:
+            print(f"❌ Erreur lors de la synchronisation des commandes: {e}")
+            return []
+
+    async def resolve_channel(self, channel_id):
+        """Résout un canal : cache gateway d'abord, puis un seul fetch REST mémorisé"""
+        channel = self._channel_cache.get(channel_id)
+        if channel is not None:
+            return channel
+
+        channel = self.bot.get_channel(channel_id)
+        if channel is None:
+            channel = await self.bot.fetch_channel(channel_id)
+            logger.info("🔎 Canal %s récupéré via l'API", channel_id)
+
+        if channel is not None:
+            self._channel_cache[channel_id] = channel
+        return channel
+
+    def invalidate_channel(self, channel_id):
+        """Retire un canal du cache (suppression ou modification)"""
+        if self._channel_cache.pop(channel_id, None) is not None:
+            logger.info("♻️ Cache du canal %s invalidé", channel_id)
+
+    async def resolve_user_name(self, user_id, guild=None):
+        """Nom d'un utilisateur : cache, puis cache des membres, puis un fetch REST mémorisé"""
+        now = time.monotonic()
+        cached = self._user_cache.get(user_id)
+        if cached is not None and cached[1] > now:
+            return cached[0]
+
+        user = guild.get_member(user_id) if guild is not None else None
+        if user is None:
+            user = self.bot.get_user(user_id)
+        if user is None:
+            if self._user_fetch_semaphore is None:
+                self._user_fetch_semaphore = asyncio.Semaphore(USER_FETCH_CONCURRENCY)
+            async with self._user_fetch_semaphore:
+                try:
+                    user = await self.bot.fetch_user(user_id)
+                except discord.NotFound:
+                    user = None
+                except discord.HTTPException as e:
+                    # Erreur transitoire : pas de mise en cache
+                    logger.warning("⚠️ Impossible de récupérer l'utilisateur %s: %s", user_id, e)
+                    return None
+
+        name = user.display_name if user is not None else None
+        self._user_cache[user_id] = (name, now + USER_CACHE_TTL)
+        return name
+
+    async def resolve_user_names(self, user_ids, guild=None):
+        """Résout plusieurs utilisateurs en parallèle (appels REST limités par un sémaphore)"""
+        return await asyncio.gather(*(self.resolve_user_name(user_id, guild) for user_id in user_ids))
+
     async def fetch_channel(self, channel_id):
-        channel = await self.bot.fetch_channel(channel_id)
+        channel = await self.resolve_channel(channel_id)
         return channel
 
 
@@ -734,12 +1196,6 @@ async def stop_bot():
     """Arrête le bot Discord"""
     await discord_bot.stop()
 
-async def sync_commands():
-    """Synchronise les commandes slash manuellement"""
-    try:
-        synced = await discord_bot.bot.tree.sync()
-        print(f"✓ {len(synced)} commandes synchronisées manuellement")
-        return synced
-    except Exception as e:
-        print(f"❌ Erreur synchronisation manuelle: {e}")
-        return []
\ No newline at end of file
+async def sync_commands(force=True):
+    """Synchronise les commandes slash manuellement (forcée par défaut)"""
+    return await discord_bot.sync_commands(force=force)
\ No newline at end of file
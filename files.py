@@ -0,0 +1,21 @@
+import json
+import os
+
+
+def write_atomic(path, text):
+    """Écrit un fichier texte de façon atomique : fichier temporaire synchronisé sur disque, puis
+    renommage (un arrêt brutal laisse l'ancienne version ou la nouvelle, jamais un fichier tronqué)"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def write_json_atomic(path, data):
+    """Sérialise `data` en JSON et l'écrit de façon atomique"""
+    write_atomic(path, json.dumps(data))
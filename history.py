@@ -0,0 +1,135 @@
+import os
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_right
+
+# Nombre de mesures conservées par capteur (24h à une mesure toutes les 30 s)
+HISTORY_SIZE = int(os.getenv("HISTORY_SIZE", "2880"))
+# Écart minimal (s) entre les deux moitiés de la fenêtre pour calculer une tendance
+MIN_TREND_SECONDS = 60
+
+_WINDOW_UNITS = {"s": 1, "m": 60, "min": 60, "h": 3600, "d": 86400, "j": 86400}
+
+
+def parse_window(window):
+    """Convertit une fenêtre du type '30m', '10 min', '1h', '24h' ou '7d' en secondes"""
+    match = re.fullmatch(r"\s*(\d+)\s*(min|[smhdj])\s*", window.lower())
+    if not match:
+        raise ValueError(f"Fenêtre invalide: {window}")
+    return int(match.group(1)) * _WINDOW_UNITS[match.group(2)]
+
+
+class RingBuffer:
+    """Buffer circulaire à taille fixe de (timestamp, valeur) stocké dans des array('d')"""
+
+    def __init__(self, capacity=HISTORY_SIZE):
+        self.capacity = capacity
+        self.timestamps = array("d", bytes(8 * capacity))
+        self.values = array("d", bytes(8 * capacity))
+        self.head = 0  # Prochaine case à écrire
+        self.count = 0
+
+    def append(self, timestamp, value):
+        """Ajoute une mesure en O(1), en écrasant la plus ancienne si le buffer est plein"""
+        self.timestamps[self.head] = timestamp
+        self.values[self.head] = value
+        self.head = (self.head + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+
+    def _segments(self):
+        """Plages physiques (début, fin) dans l'ordre chronologique"""
+        start = (self.head - self.count) % self.capacity
+        if start + self.count <= self.capacity:
+            return [(start, start + self.count)]
+        return [(start, self.capacity), (0, self.head)]
+
+    def window(self, since):
+        """Copie les mesures depuis `since`, plus la dernière mesure antérieure (valeur en vigueur)"""
+        segments = self._segments()
+        timestamps, values = array("d"), array("d")
+        previous = None
+        for lo, hi in segments:
+            # Recherche dichotomique : les timestamps sont croissants dans chaque segment
+            index = bisect_right(self.timestamps, since, lo, hi)
+            if index > lo:
+                previous = index - 1
+            timestamps.extend(self.timestamps[index:hi])
+            values.extend(self.values[index:hi])
+        if previous is not None:
+            timestamps.insert(0, since)
+            values.insert(0, self.values[previous])
+        return timestamps, values
+
+
+def summarize(timestamps, values):
+    """Calcule min/max/moyenne/tendance (°C/h) sans boucle Python sur les mesures"""
+    count = len(values)
+    if not count:
+        return None
+
+    stats = {
+        "count": count,
+        "min": min(values),
+        "max": max(values),
+        "mean": sum(values) / count,
+        "last": values[-1],
+        "trend": 0.0,
+    }
+
+    # Tendance : écart entre la moyenne de la seconde moitié et celle de la première
+    half = count // 2
+    if half:
+        first_mean = sum(values[:half]) / half
+        second_mean = sum(values[half:]) / (count - half)
+        first_time = (timestamps[0] + timestamps[half - 1]) / 2
+        second_time = (timestamps[half] + timestamps[-1]) / 2
+        elapsed = second_time - first_time
+        if elapsed >= MIN_TREND_SECONDS:
+            stats["trend"] = (second_mean - first_mean) / elapsed * 3600
+    return stats
+
+
+class SensorHistory:
+    """Historique en mémoire de chaque capteur numérique"""
+
+    def __init__(self, capacity=HISTORY_SIZE):
+        self.capacity = capacity
+        self._buffers = {}
+        self._lock = threading.Lock()
+
+    def record(self, key, value, timestamp=None):
+        """Enregistre une mesure (appelé depuis le thread MQTT)"""
+        if timestamp is None:
+            timestamp = time.time()
+        with self._lock:
+            buffer = self._buffers.get(key)
+            if buffer is None:
+                buffer = self._buffers[key] = RingBuffer(self.capacity)
+            buffer.append(timestamp, value)
+
+    def covers(self, key, since):
+        """Indique si le buffer contient encore des mesures antérieures à `since`"""
+        with self._lock:
+            buffer = self._buffers.get(key)
+            if buffer is None or not buffer.count:
+                return False
+            oldest = (buffer.head - buffer.count) % buffer.capacity
+            return buffer.timestamps[oldest] <= since
+
+    def keys(self):
+        with self._lock:
+            return list(self._buffers)
+
+    def stats(self, key, seconds, now=None):
+        """Statistiques d'un capteur sur les `seconds` dernières secondes"""
+        if now is None:
+            now = time.time()
+        with self._lock:
+            buffer = self._buffers.get(key)
+            if buffer is None:
+                return None
+            timestamps, values = buffer.window(now - seconds)
+        return summarize(timestamps, values)
@@ -0,0 +1,108 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()  # text ou json
+# Intervalle minimal (s) entre deux logs DEBUG d'un même topic ou capteur
+LOG_TOPIC_INTERVAL = float(os.getenv("LOG_TOPIC_INTERVAL", "60"))
+
+ROOT_LOGGER = "discobot"
+
+_listener = None
+_setup_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """Une ligne JSON par enregistrement"""
+
+    def format(self, record):
+        data = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        sample_key = getattr(record, "sample_key", None)
+        if sample_key is not None:
+            data["key"] = sample_key
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False)
+
+
+class TopicRateLimitFilter(logging.Filter):
+    """Limite les logs DEBUG portant un attribut `sample_key` (topic, capteur) à un par intervalle et par clé"""
+
+    def __init__(self, interval=LOG_TOPIC_INTERVAL):
+        super().__init__()
+        self.interval = interval
+        self._last = {}
+
+    def filter(self, record):
+        key = getattr(record, "sample_key", None)
+        if key is None or record.levelno > logging.DEBUG:
+            return True
+        now = time.monotonic()
+        last = self._last.get(key)
+        if last is not None and now - last < self.interval:
+            return False
+        self._last[key] = now
+        return True
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler qui laisse le formatage au thread d'écriture (coût appelant : un put)"""
+
+    def prepare(self, record):
+        if record.exc_info:
+            return super().prepare(record)
+        return record
+
+
+def setup_logging(level=LOG_LEVEL, fmt=LOG_FORMAT):
+    """Configure la journalisation asynchrone (idempotent)"""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return
+
+        stream = logging.StreamHandler(sys.stdout)
+        if fmt == "json":
+            stream.setFormatter(JsonFormatter())
+        else:
+            stream.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+        log_queue = queue.SimpleQueue()
+        handler = _DeferredQueueHandler(log_queue)
+        handler.addFilter(TopicRateLimitFilter())
+
+        root = logging.getLogger(ROOT_LOGGER)
+        root.setLevel(level)
+        root.addHandler(handler)
+        root.propagate = False
+
+        _listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Vide la queue et arrête le thread d'écriture"""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+def get_logger(name):
+    """Logger enfant de 'discobot', avec la configuration asynchrone en place"""
+    setup_logging()
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
@@ -6,7 +6,10 @@ import sys
 from discobot import start_bot, stop_bot
 
 # Import MQTT client
-from mqtt import mqtt_client
+from mqtt import mqtt_manager
+
+# Metrics endpoint
+from metrics import metrics
 
 # Flag to track if a shutdown is in progress
 shutdown_in_progress = False
@@ -27,12 +30,14 @@ async def shutdown(signal_received=None):
     
     # Stop MQTT client
     try:
-        mqtt_client.loop_stop()
-        mqtt_client.disconnect()
+        mqtt_manager.disconnect()
         print("✓ Client MQTT déconnecté")
     except Exception as e:
         print(f"❌ Erreur lors de l'arrêt du client MQTT: {e}")
     
+    # Stop metrics endpoint
+    metrics.stop_server()
+
     # Stop Discord bot
     try:
         await stop_bot()
@@ -44,8 +49,13 @@ async def shutdown(signal_received=None):
 async def main():
     """Main function to run the bot and MQTT client"""
     try:
-        # MQTT client is already initialized and connected in mqtt.py
+        # MQTT client is already initialized and connected in mqtt.py,
+        # except in asyncio transport mode where it runs on this event loop
+        await mqtt_manager.start_asyncio()
         print("✓ Client MQTT initialisé")
+
+        # Expose Prometheus metrics locally
+        metrics.start_server()
         
         # Start the Discord bot
         print("🤖 Démarrage du bot Discord...")
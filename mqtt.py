@@ -1,126 +1,528 @@
 import json
+import logging
 import os
-import random
 import asyncio
 import threading
+import time
 
-import paho.mqtt.client as mqtt
 from dotenv import load_dotenv
 
+from alerts import AlertEngine
+from broker import BrokerConnection, load_broker_configs
+from history import SensorHistory, summarize
+from logs import get_logger
+from metrics import metrics
+from rollups import RollupEngine
+from snapshot import StateSnapshot
+from state import StateStore
+from registry import RegistryWatcher, diff_subscriptions, load_registry, subscriptions
+from topics import TopicRouter, resolve_key
+from tsdb import TimeSeriesStore
+
+# Décodeur JSON rapide si orjson est installé, sinon module standard
+try:
+    import orjson
+
+    def json_loads(data):
+        return orjson.loads(data)
+except ImportError:
+    orjson = None
+
+    def json_loads(data):
+        return json.loads(data)
+
 load_dotenv(dotenv_path="config")
 
+logger = get_logger("mqtt")
+
+MQTT_MESSAGES = metrics.counter("mqtt_messages_total", "Messages MQTT reçus par topic", ("topic",))
+MQTT_DUPLICATES = metrics.counter("mqtt_duplicates_total", "Payloads identiques ignorés par topic", ("topic",))
+MQTT_ERRORS = metrics.counter("mqtt_message_errors_total", "Messages MQTT en erreur", ("kind",))
+MQTT_DECODE_SECONDS = metrics.histogram("mqtt_decode_seconds", "Temps de décodage JSON d'un payload")
+MQTT_HANDLE_SECONDS = metrics.histogram("mqtt_handle_seconds", "Temps de traitement complet d'un message")
+MQTT_RETAINED = metrics.counter("mqtt_retained_total", "Messages retenus reçus (état reconstruit à la connexion)")
+
+# QoS des publications vers un topic absent du registre des actionneurs
+MQTT_PUBLISH_QOS = int(os.getenv("MQTT_PUBLISH_QOS", "0"))
+# Nombre maximal de topics dont le dernier payload est conservé (détection des republications identiques)
+MQTT_LAST_PAYLOADS_MAX = int(os.getenv("MQTT_LAST_PAYLOADS_MAX", "10000"))
+# false : aucune connexion aux brokers (banc de mesure hors-ligne)
+MQTT_AUTOCONNECT = os.getenv("MQTT_AUTOCONNECT", "true").strip().lower() not in ("0", "false", "no", "off")
+
+
+class _Expectation:
+    """Attente d'un état : future asyncio résolue par _on_message quand `predicate(payload)` est vrai"""
+    __slots__ = ("loop", "future", "predicate")
+
+    def __init__(self, loop, future, predicate):
+        self.loop = loop
+        self.future = future
+        self.predicate = predicate
+
+
+def _set_future_result(future, result):
+    if not future.done():
+        future.set_result(result)
+
+
 class MQTTManager:
     def __init__(self):
-        self.broker = os.getenv("MQTT_BROKER")
-        self.port = int(os.getenv("MQTT_PORT"))
-        self.username = os.getenv("MQTT_USER")
-        self.password = os.getenv("MQTT_PASSWORD")
-        self.client_id = f'python-mqtt-{random.randint(0, 1000)}'
-
-        self.dico_topics = {
-            "salon_t": ("zwave/Salon/Salon_-_Oeil/49/0/Air_temperature", "value"),
-            "parents_t": ("zwave/Chambre_Parents/Chambre_Parents_-_Oeil/49/0/Air_temperature", "value"),
-            "greg_t": ("zwave/Chambre_Greg/Chambre_Greg_-_Oeil/49/0/Air_temperature", "value"),
-            "ext_t": ("zigbee2mqtt/Maison - Temperature exterieur", "temperature"),
-            "batcave_t": ("zigbee2mqtt/Batcave - Temperature", "temperature"),
-            "sdb_t": ("zigbee2mqtt/Salle de bain - Temperature", "temperature"),
-            "imprimante_3d_t": ("zigbee2mqtt/Batcave - Imprimante 3D", "temperature"),
-            "cuisine_t": ("zigbee2mqtt/Cuisine - Temperature", "temperature"),
-            "cuisine_congelateur_t": ("zigbee2mqtt/Cuisine - Congelateur", "temperature"),
-            "cuisine_refrigerateur_t": ("zigbee2mqtt/Cuisine - Refrigerateur", "temperature"),
-            "nuki": ("nukihub/lock/json", "lock_state")
-        }
-
-        self.dico_valeurs = {}
+        # Brokers nommés (un seul "default" sans MQTT_BROKERS) ; le premier reçoit les topics sans broker
+        self.broker_configs = load_broker_configs()
+        self.broker_names = {config.name for config in self.broker_configs}
+        self.default_broker = self.broker_configs[0].name
+        # Fonction d'envoi vers Discord, fournie par le bot (voir DiscordBot.set_mqtt_manager)
+        self.notifier = None
+
+        # Registre des capteurs chargé depuis SENSORS_CONFIG (les topics peuvent contenir des jokers
+        # MQTT : la clé "zb_{}_t" sur "zigbee2mqtt/+" est complétée par le segment capturé)
+        self.sensors, self.actuators = self._load_registry()
+        # Compatibilité : clé → (topic, champ)
+        self.dico_topics = {cle: (entry.topic, entry.field) for cle, entry in self.sensors.items()}
+        # Incrémenté à chaque rechargement du registre
+        self.registry_version = 0
+        # QoS et broker de publication par topic de commande, broker de chaque topic d'état
+        self.publish_qos, self.publish_brokers, self.publish_ttls, self.state_brokers = \
+            self._make_publish_routes(self.actuators)
+        self._check_brokers(self.sensors, self.actuators)
+
+        # Dernières valeurs et horodatages, publiés en snapshots immuables versionnés
+        # (voir les propriétés dico_valeurs / dico_horodatages)
+        self.state = StateStore()
         self.previous_nuki_state = None
 
-        # Initialiser le client MQTT
-        self.mqtt_client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=self.client_id)
-        self.mqtt_client.on_connect = self._on_connect
-        self.mqtt_client.on_message = self._on_message
-        self.mqtt_client.username_pw_set(self.username, self.password)
+        # Historique en mémoire (buffer circulaire par capteur) et persistant sur disque
+        self.history = SensorHistory()
+        self.store = TimeSeriesStore()
+
+        # Agrégats 1 min / 1 h / 1 jour, maintenus à chaque mesure. La sauvegarde, complétée depuis
+        # la TSDB des mesures postérieures (fichier absent, arrêt brutal), est rechargée en tâche de
+        # fond : d'ici là les statistiques sont calculées sur les mesures brutes
+        self.rollups = RollupEngine()
+        self._rollups_ready = threading.Event()
+        threading.Thread(target=self._rebuild_rollups, args=(time.time(),), name="rollups-rebuild",
+                         daemon=True).start()
+
+        # Règles d'alerte (section "rules" du registre), évaluées à chaque mesure numérique
+        self.alerts = AlertEngine(self.send_discord_message)
+        self.alerts.reload()
 
-        # Se connecter
-        self._connect()
+        # Index topic → (clé, champ, handler), avec support des jokers MQTT (+/#)
+        self.router = self._make_router(self.sensors)
 
-    def send_discord_message(self, message):
-        """Envoie un message Discord via la méthode synchrone"""
+        # Attentes d'état en cours (topic → [_Expectation])
+        self._expectations = {}
+        self._expectations_lock = threading.Lock()
+
+        # Dernier payload brut reçu par topic, pour ignorer les republications identiques (topics
+        # concrets, au plus MQTT_LAST_PAYLOADS_MAX : un filtre "#" peut en faire correspondre beaucoup)
+        self._last_payloads = {}
+        self.duplicates_dropped = 0
+
+        # Démarrage à chaud : dernier état connu restauré avant la connexion MQTT
+        self.snapshot = StateSnapshot()
+        self._restore_snapshot()
+        self.snapshot.start(self.save_state)
+
+        # Rechargement à chaud du registre quand le fichier de configuration change (surveillance
+        # démarrée une fois les connexions aux brokers créées)
+        self.registry_watcher = RegistryWatcher(self.reload_registry)
+
+        # Une connexion par broker (client paho, boucle réseau et file hors-ligne propres),
+        # toutes alimentant le même _on_message et donc le même état partagé
+        self.brokers = {}
+        for config in self.broker_configs:
+            self.brokers[config.name] = BrokerConnection(
+                config, self._on_message, lambda name=config.name: self._broker_topics(name))
+
+        metrics.gauge("mqtt_connected", "1 si le client MQTT est connecté",
+                      lambda: {(name,): int(b.is_connected()) for name, b in self.brokers.items()}, ("broker",))
+        metrics.gauge("mqtt_reconnect_attempts", "Tentatives de reconnexion depuis la dernière connexion stable",
+                      lambda: {(name,): b.supervisor.backoff.attempts for name, b in self.brokers.items()},
+                      ("broker",))
+        metrics.gauge("mqtt_sensors_known", "Nombre de valeurs de capteurs connues", lambda: len(self.dico_valeurs))
+        metrics.gauge("mqtt_outbox_depth", "Commandes en attente de reconnexion",
+                      lambda: {(name,): len(b.outbox) for name, b in self.brokers.items()}, ("broker",))
+        metrics.gauge("mqtt_publish_inflight", "Publications en attente d'acquittement",
+                      lambda: {(name,): b.inflight() for name, b in self.brokers.items()}, ("broker",))
+
+        self.registry_watcher.start()
+
+        # Se connecter (en mode asyncio, la connexion est faite par start_asyncio() sur la boucle du bot)
+        if MQTT_AUTOCONNECT:
+            for connection in self.brokers.values():
+                connection.start()
+
+    @property
+    def mqtt_client(self):
+        """Client paho du broker par défaut (compatibilité)"""
+        return self.brokers[self.default_broker].client
+
+    @mqtt_client.setter
+    def mqtt_client(self, client):
+        self.brokers[self.default_broker].client = client
+
+    @property
+    def dico_valeurs(self):
+        """Dernières valeurs connues (vue immuable du snapshot courant)"""
+        return self.state.snapshot().values
+
+    @property
+    def dico_horodatages(self):
+        """Horodatage de la dernière mise à jour de chaque valeur (vue immuable du snapshot courant)"""
+        return self.state.snapshot().timestamps
+
+    def send_discord_message(self, message, category=None, key=None):
+        """Envoie un message Discord via la méthode synchrone (canal choisi selon la catégorie / le capteur)"""
         try:
-            from discobot import discord_bot
-            discord_bot.send_message_sync(message)
-            print(f"📧 Message Discord envoyé à la queue: {message}")
+            notifier = self.notifier
+            if notifier is None:
+                from discobot import discord_bot
+                notifier = discord_bot.send_message_sync
+            notifier(message, category=category, key=key)
+            logger.debug("📧 Message Discord envoyé à la queue: %s", message)
         except Exception as e:
-            print(f"❌ Erreur envoi Discord: {e}")
+            logger.error("❌ Erreur envoi Discord: %s", e)
 
-    def _on_connect(self, client, userdata, flags, reason_code, properties=None):
-        print(f"MQTT connecté avec le code {reason_code}")
-        # S'abonner aux topics spécifiques
-        for topic, _ in self.dico_topics.values():
-            client.subscribe(topic)
-        print(f"✓ Abonné à {len(self.dico_topics)} topics")
+    def _restore_snapshot(self):
+        """Recharge les dernières valeurs connues et l'état du verrou"""
+        data = self.snapshot.load()
+        if not data:
+            return
+        values = {cle: value for cle, (value, _) in data["values"].items()}
+        timestamps = {cle: timestamp for cle, (_, timestamp) in data["values"].items()}
+        self.state.update_many(values, timestamps)
+        # Évite une fausse alerte de changement d'état au premier message du verrou
+        self.previous_nuki_state = data.get("nuki")
+        logger.info("♻️ %d valeurs restaurées depuis %s", len(data["values"]), self.snapshot.path)
 
-    def _on_message(self, client, userdata, msg):
+    def _rebuild_rollups(self, end):
+        """Recharge les agrégats sauvegardés, y rejoue les mesures de la TSDB écrites ensuite (jusqu'à
+        end, début des mesures en direct), puis les fusionne avec celles reçues entre-temps"""
+        started = time.perf_counter()
         try:
-            # Traitement spécial pour le verrou Nuki
-            if msg.topic == self.dico_topics.get("nuki")[0]:
-                payload = json.loads(msg.payload.decode("utf-8"))
-                current_state = payload.get("lock_state", "unknown")
-                # Vérifier si l'état a changé de locked à unlocked
-                etat_porte = "dévérouillée" if current_state == "unlocked" else "verrouillée"
-                if self.previous_nuki_state != current_state:
-                    self.send_discord_message(f"🔓 **La porte vient d'être {etat_porte} !**")
-                # Mettre à jour l'état précédent et le dictionnaire de valeurs
-                self.previous_nuki_state = current_state
-                self.dico_valeurs["nuki"] = current_state
-                print(f"🔐 Nuki: {current_state}")
-                return
+            rebuilt = RollupEngine(self.rollups.resolutions)
+            rebuilt.load()
+            since = rebuilt.saved_at or 0
+            count = 0
+            for cle, timestamp, value in self.store.replay(since, end):
+                if timestamp > since:
+                    rebuilt.add(cle, value, timestamp)
+                    count += 1
+            self.rollups.merge(rebuilt)
+        except Exception as e:
+            # Agrégats incomplets : ni utilisés ni sauvegardés (la TSDB sera rejouée au prochain démarrage)
+            logger.error("❌ Erreur reconstruction des agrégats: %s", e)
+            return
+        self._rollups_ready.set()
+        logger.info("♻️ Agrégats rechargés, %d mesures rejouées depuis la TSDB (%.1fs)",
+                    count, time.perf_counter() - started)
 
-            # Traitement pour les autres capteurs
-            for cle, (topic, field) in self.dico_topics.items():
-                if msg.topic == topic and cle != "nuki":
-                    payload = json.loads(msg.payload.decode("utf-8"))
-                    self.dico_valeurs[cle] = payload.get(field, 0)
-                    print(f"📊 {cle}: {self.dico_valeurs[cle]}°C")
-                    break
+    def rollups_ready(self):
+        """Vrai une fois les agrégats sauvegardés rechargés et complétés depuis la TSDB"""
+        return self._rollups_ready.is_set()
 
-        except json.JSONDecodeError:
-            print(f"❌ Erreur de décodage JSON pour {msg.topic}")
+    def save_state(self, final=False):
+        """Sauvegarde le dernier état connu, et les agrégats à leur propre rythme (ou à l'arrêt)"""
+        state = self.state.snapshot()
+        self.snapshot.save(dict(state.values), dict(state.timestamps), self.previous_nuki_state)
+        # Tant qu'ils sont en cours de reconstruction, les agrégats ne contiennent que les mesures récentes
+        if self.rollups_ready() and (final or self.rollups.save_due()):
+            self.rollups.save()
+
+    def value_age(self, cle):
+        """Âge en secondes de la dernière valeur d'un capteur (None si inconnue)"""
+        timestamp = self.state.snapshot().timestamps.get(cle)
+        return None if timestamp is None else time.time() - timestamp
+
+    def _load_registry(self):
+        """Charge le registre des capteurs et actionneurs depuis le fichier de configuration"""
+        try:
+            registry = load_registry()
+            logger.info("✓ %d capteurs et %d actionneurs chargés", len(registry.sensors), len(registry.actuators))
+            return registry
         except Exception as e:
-            print(f"❌ Erreur dans on_message: {e}")
+            logger.error("❌ Erreur chargement du registre des capteurs: %s", e)
+            return {}, {}
 
-    def _connect(self):
-        """Se connecter au broker MQTT"""
+    def reload_registry(self):
+        """Recharge le registre à chaud : seule la différence de topics est (dés)abonnée"""
         try:
-            self.mqtt_client.connect(self.broker, self.port, 60)
-            self.mqtt_client.loop_start()
-            print(f"🔗 Connexion MQTT initiée vers {self.broker}:{self.port}")
+            registry = load_registry()
         except Exception as e:
-            print(f"❌ Erreur de connexion MQTT: {e}")
+            logger.error("❌ Registre invalide, rechargement ignoré: %s", e)
+            return False
+
+        changes = {name: diff_subscriptions(self._broker_sensors(name, self.sensors),
+                                            self._broker_sensors(name, registry.sensors))
+                   for name in self.brokers}
+        router = self._make_router(registry.sensors)
+        self._check_brokers(registry.sensors, registry.actuators)
+
+        # Remplacement atomique des références lues par _on_message
+        self.router = router
+        self.sensors, self.actuators = registry
+        self.publish_qos, self.publish_brokers, self.publish_ttls, self.state_brokers = \
+            self._make_publish_routes(self.actuators)
+        self.dico_topics = {cle: (entry.topic, entry.field) for cle, entry in self.sensors.items()}
+        self.registry_version += 1
+        self.alerts.reload()
+        # Payloads mémorisés par topic concret : seuls ceux encore routés sont conservés
+        self._last_payloads = {topic: raw for topic, raw in list(self._last_payloads.items())
+                               if router.match(topic)}
+        for name, (removed, added) in changes.items():
+            self.brokers[name].unsubscribe(removed)
+            self.brokers[name].subscribe(added)
+        logger.info("♻️ Registre rechargé: +%d / -%d topics, %d capteurs, %d actionneurs",
+                    sum(len(added) for _, added in changes.values()),
+                    sum(len(removed) for removed, _ in changes.values()),
+                    len(self.sensors), len(self.actuators))
+        return True
+
+    def _broker_of(self, entry):
+        """Nom du broker d'un capteur ou d'un actionneur (broker par défaut si absent ou inconnu)"""
+        if entry.broker is None:
+            return self.default_broker
+        if entry.broker not in self.broker_names:
+            return self.default_broker
+        return entry.broker
+
+    def _check_brokers(self, sensors, actuators):
+        for entry in list(sensors.values()) + list(actuators.values()):
+            if entry.broker is not None and entry.broker not in self.broker_names:
+                logger.warning("⚠️ Broker '%s' inconnu pour %s, broker par défaut utilisé", entry.broker, entry.key)
+
+    def _broker_sensors(self, name, sensors):
+        return {key: entry for key, entry in sensors.items() if self._broker_of(entry) == name}
+
+    def _broker_topics(self, name):
+        """Liste (topic, qos) des capteurs d'un broker, abonnée à chaque connexion"""
+        return subscriptions(self._broker_sensors(name, self.sensors))
+
+    def get_actuators(self, kind):
+        """Actionneurs d'un type donné : clé → topic de commande"""
+        return {key: entry.topic for (entry_kind, key), entry in self.actuators.items() if entry_kind == kind}
+
+    def _make_publish_routes(self, actuators):
+        """QoS, broker et durée de mise en attente de chaque topic de commande, broker de chaque topic d'état"""
+        qos = {entry.topic: entry.qos for entry in actuators.values()}
+        brokers = {entry.topic: self._broker_of(entry) for entry in actuators.values()}
+        ttls = {entry.topic: entry.outbox_ttl for entry in actuators.values()}
+        state_brokers = {entry.state_topic: self._broker_of(entry) for entry in actuators.values()}
+        return qos, brokers, ttls, state_brokers
+
+    def get_actuator(self, kind, key):
+        """Description complète d'un actionneur (None si inconnu)"""
+        return self.actuators.get((kind, key))
+
+    def state_sensor(self, actuator):
+        """Capteur du registre alimenté par le topic d'état d'un actionneur (None si aucun)"""
+        for entry in self.sensors.values():
+            if entry.topic == actuator.state_topic:
+                return entry
+        return None
+
+    def expect(self, topic, predicate):
+        """Future résolue avec le premier payload de `topic` qui satisfait `predicate`
+
+        À appeler depuis la boucle asyncio, avant de publier la commande. L'attente est retirée
+        du registre dès que la future est terminée (résolue, annulée ou expirée via wait_for).
+        """
+        loop = asyncio.get_running_loop()
+        expectation = _Expectation(loop, loop.create_future(), predicate)
+        with self._expectations_lock:
+            self._expectations.setdefault(topic, []).append(expectation)
+        expectation.future.add_done_callback(lambda _: self._discard_expectation(topic, expectation))
+        self._ensure_subscribed(topic)
+        return expectation.future
+
+    def _discard_expectation(self, topic, expectation):
+        with self._expectations_lock:
+            waiters = self._expectations.get(topic)
+            if waiters and expectation in waiters:
+                waiters.remove(expectation)
+                if not waiters:
+                    del self._expectations[topic]
+
+    def _resolve_expectations(self, topic, payload):
+        """Résout les attentes de `topic` satisfaites par ce payload (appelé depuis _on_message)"""
+        with self._expectations_lock:
+            waiters = list(self._expectations.get(topic, ()))
+        for expectation in waiters:
+            try:
+                matched = expectation.predicate(payload)
+            except Exception:
+                matched = False
+            if matched:
+                expectation.loop.call_soon_threadsafe(_set_future_result, expectation.future, payload)
+
+    def _ensure_subscribed(self, topic):
+        """Abonne, sur le broker de l'appareil, un topic d'état non couvert par le registre des capteurs"""
+        connection = self.brokers[self.state_brokers.get(topic, self.default_broker)]
+        if topic in connection.extra_topics or self.router.match(topic):
+            return
+        connection.extra_topics.add(topic)
+        connection.subscribe([(topic, 1)])
 
-    def publish_message(self, topic, message):
-        """Fonction pour publier un message MQTT"""
+    def _make_router(self, sensors):
+        """Construit l'index de routage à partir d'un registre de capteurs"""
+        handlers = {"lock": self._handle_nuki}
+        router = TopicRouter()
+        for entry in sensors.values():
+            router.add(entry.topic, (entry, handlers.get(entry.kind, self._handle_sensor)))
+        return router
+
+    def _handle_nuki(self, cle, entry, payload, retained=False):
+        """Traitement spécial pour le verrou Nuki"""
+        current_state = payload.get(entry.field)
+        if current_state is None:
+            return
+        # Vérifier si l'état a changé de locked à unlocked
+        etat_porte = "dévérouillée" if current_state == "unlocked" else "verrouillée"
+        if self.previous_nuki_state != current_state:
+            if not retained:
+                self.send_discord_message(f"🔓 **La porte vient d'être {etat_porte} !**", category="security", key=cle)
+            elif self.previous_nuki_state is not None:
+                # État retenu différent du dernier connu : changement survenu pendant la déconnexion
+                self.send_discord_message(f"🔓 **La porte a été {etat_porte} pendant la déconnexion !**",
+                                          category="security", key=cle)
+        # Mettre à jour l'état précédent et le dictionnaire de valeurs
+        self.previous_nuki_state = current_state
+        if retained:
+            self.state.update_retained(cle, current_state)
+        else:
+            self.state.update(cle, current_state, time.time())
+        logger.info("🔐 Nuki: %s", current_state)
+
+    def _handle_sensor(self, cle, entry, payload, retained=False):
+        """Traitement pour les capteurs numériques (température...)"""
+        value = payload.get(entry.field)
+        # Un filtre à jokers couvre aussi des appareils sans ce champ (écho d'une lampe, contact de porte)
+        if value is None:
+            return
+        if retained:
+            # Dernière valeur gardée par le broker : reconstruit l'état, mais n'est ni une nouvelle
+            # mesure ni une valeur fraîche
+            self.state.update_retained(cle, value)
+            return
+        timestamp = time.time()
+        self.state.update(cle, value, timestamp)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            self.history.record(cle, value, timestamp)
+            self.store.append(cle, value, timestamp)
+            self.rollups.add(cle, value, timestamp)
+            self.alerts.evaluate(cle, value, timestamp)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("📊 %s: %s%s", cle, value, entry.unit, extra={"sample_key": cle})
+
+    def _on_message(self, client, userdata, msg):
+        started = time.perf_counter()
+        MQTT_MESSAGES.inc(msg.topic)
         try:
-            self.mqtt_client.publish(topic, message)
-            print(f"📤 Message publié sur {topic}: {message}")
+            routes = self.router.match(msg.topic)
+            waiting = msg.topic in self._expectations
+            if not routes and not waiting:
+                return
+            if msg.retain:
+                MQTT_RETAINED.inc()
+
+            # Payload identique au précédent : rien à décoder (sauf si une commande attend cet état)
+            raw = msg.payload
+            if not waiting and self._last_payloads.get(msg.topic) == raw:
+                self.duplicates_dropped += 1
+                MQTT_DUPLICATES.inc(msg.topic)
+                if msg.retain:
+                    return
+                # Valeur inchangée mais fraîchement rapportée : horodatage mis à jour sans décodage,
+                # et dépassement prolongé pour les règles en attente
+                now = time.time()
+                keys = [resolve_key(entry.key, captures) for (entry, handler), captures in routes]
+                self.state.touch(keys, now)
+                if self.alerts.pending:
+                    for cle in keys:
+                        self.alerts.still(cle, now)
+                return
+            last_payloads = self._last_payloads
+            if msg.topic not in last_payloads and len(last_payloads) >= MQTT_LAST_PAYLOADS_MAX:
+                # Le topic mémorisé depuis le plus longtemps est oublié
+                last_payloads.pop(next(iter(last_payloads)), None)
+            last_payloads[msg.topic] = raw
+
+            decode_started = time.perf_counter()
+            payload = json_loads(raw)
+            MQTT_DECODE_SECONDS.observe(time.perf_counter() - decode_started)
+            if not isinstance(payload, dict):
+                return
+            if waiting:
+                self._resolve_expectations(msg.topic, payload)
+            for (entry, handler), captures in routes:
+                handler(resolve_key(entry.key, captures), entry, payload, msg.retain)
+            MQTT_HANDLE_SECONDS.observe(time.perf_counter() - started)
+
+        except json.JSONDecodeError:
+            MQTT_ERRORS.inc("decode")
+            logger.warning("❌ Erreur de décodage JSON pour %s", msg.topic)
         except Exception as e:
-            print(f"❌ Erreur lors de la publication: {e}")
+            MQTT_ERRORS.inc("handler")
+            logger.exception("❌ Erreur dans on_message: %s", e)
+
+    async def start_asyncio(self):
+        """Connecte les brokers en mode asyncio sur la boucle courante, indépendamment les uns des autres"""
+        if MQTT_AUTOCONNECT:
+            await asyncio.gather(*(connection.start_asyncio() for connection in self.brokers.values()))
+
+    def publish_message(self, topic, message, qos=None, retain=False):
+        """Publie un message MQTT avec la QoS du topic, sur le broker de l'appareil
+
+        Retourne le MQTTMessageInfo de paho ; si le broker est injoignable, QUEUED quand la commande
+        est mise en attente (rejouée dans l'ordre à la reconnexion, sauf si expirée), ou None quand
+        l'actionneur interdit la mise en attente (verrou).
+        """
+        if qos is None:
+            qos = self.publish_qos.get(topic, MQTT_PUBLISH_QOS)
+        connection = self.brokers[self.publish_brokers.get(topic, self.default_broker)]
+        return connection.publish(topic, message, qos, retain, self.publish_ttls.get(topic))
+
+    def sensor_stats(self, cle, seconds):
+        """Statistiques d'un capteur : buffer mémoire si la fenêtre est couverte, sinon agrégats,
+        et à défaut mesures brutes du stockage disque"""
+        now = time.time()
+        if self.history.covers(cle, now - seconds):
+            return self.history.stats(cle, seconds, now)
+        stats = self.rollups.stats(cle, now - seconds, now) if self.rollups_ready() else None
+        if stats is None:
+            stats = summarize(*self.store.query(cle, now - seconds, now))
+        return stats
 
     def is_connected(self):
-        """Vérifie si le client MQTT est connecté"""
-        return self.mqtt_client.is_connected()
+        """Vérifie si tous les brokers sont connectés"""
+        return all(connection.is_connected() for connection in self.brokers.values())
+
+    def broker_status(self):
+        """État de connexion de chaque broker : nom → connecté"""
+        return {name: connection.is_connected() for name, connection in self.brokers.items()}
+
+    def connection_status(self):
+        """Superviseur de connexion de chaque broker : nom → ConnectionSupervisor"""
+        return {name: connection.supervisor for name, connection in self.brokers.items()}
 
     def disconnect(self):
-        """Déconnecte le client MQTT"""
-        self.mqtt_client.loop_stop()
-        self.mqtt_client.disconnect()
+        """Déconnecte les clients MQTT"""
+        for connection in self.brokers.values():
+            connection.stop()
+        self.registry_watcher.stop()
+        self.alerts.stop()
+        self.snapshot.stop()
+        self.store.close()
+        self.save_state(final=True)
 
 # Instance unique du gestionnaire MQTT
 mqtt_manager = MQTTManager()
 
 # Fonctions de compatibilité pour l'existant
-dico_valeurs = mqtt_manager.dico_valeurs
+dico_valeurs = mqtt_manager.state.live_values()
 mqtt_client = mqtt_manager.mqtt_client
 
-def publish_message(topic, message):
+def publish_message(topic, message, qos=None, retain=False):
     """Fonction de compatibilité"""
-    return mqtt_manager.publish_message(topic, message)
\ No newline at end of file
+    return mqtt_manager.publish_message(topic, message, qos, retain)
\ No newline at end of file
@@ -0,0 +1,115 @@
+import asyncio
+import socket
+
+import paho.mqtt.client as mqtt
+
+from logs import get_logger
+
+logger = get_logger("mqtt.asyncio")
+
+
+class AsyncioTransport:
+    """Pilote la socket paho depuis la boucle asyncio (add_reader/add_writer), sans thread réseau"""
+
+    def __init__(self, client, supervisor):
+        self.client = client
+        # ConnectionSupervisor du broker : transitions d'état et délais de reconnexion
+        self.supervisor = supervisor
+        self.loop = None
+        self._misc_task = None
+        self._reconnect_task = None
+        self._stopping = False
+
+        client.on_socket_open = self._on_socket_open
+        client.on_socket_close = self._on_socket_close
+        client.on_socket_register_write = self._on_socket_register_write
+        client.on_socket_unregister_write = self._on_socket_unregister_write
+
+    async def start(self, host, port, keepalive=60):
+        """Se connecte au broker depuis la boucle courante"""
+        self.loop = asyncio.get_running_loop()
+        self._stopping = False
+        self.supervisor.connecting()
+        try:
+            # Connexion TCP + CONNECT dans un thread : un broker lent ou injoignable ne bloque pas la boucle
+            await self.loop.run_in_executor(None, self.client.connect, host, port, keepalive)
+            logger.info("🔗 Connexion MQTT (asyncio) initiée vers %s:%s", host, port)
+        except Exception as e:
+            logger.error("❌ Erreur de connexion MQTT: %s", e)
+            self.supervisor.disconnected(e)
+            self._schedule_reconnect()
+
+    def stop(self):
+        """Déconnecte le client et arrête les tâches de maintenance"""
+        self._stopping = True
+        for task in (self._misc_task, self._reconnect_task):
+            if task and not task.done():
+                task.cancel()
+        self.client.disconnect()
+
+    # --- Callbacks de socket paho (appelés depuis la boucle, ou depuis le thread de connexion) ---
+
+    def _on_loop(self, callback, *args):
+        """Exécute `callback` sur la boucle asyncio, depuis n'importe quel thread"""
+        try:
+            on_loop = asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            callback(*args)
+        else:
+            self.loop.call_soon_threadsafe(callback, *args)
+
+    def _on_socket_open(self, client, userdata, sock):
+        self._on_loop(self._register_socket, client, sock)
+
+    def _register_socket(self, client, sock):
+        self.loop.add_reader(sock, client.loop_read)
+        if hasattr(sock, "setsockopt"):
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 2048)
+        self._misc_task = self.loop.create_task(self._misc_loop())
+
+    def _on_socket_close(self, client, userdata, sock):
+        self._on_loop(self._unregister_socket, sock)
+
+    def _unregister_socket(self, sock):
+        self.loop.remove_reader(sock)
+        self.loop.remove_writer(sock)
+        if self._misc_task and not self._misc_task.done():
+            self._misc_task.cancel()
+        if not self._stopping:
+            logger.warning("⚠️ Socket MQTT fermée, reconnexion programmée")
+            self._schedule_reconnect()
+
+    def _on_socket_register_write(self, client, userdata, sock):
+        self._on_loop(self.loop.add_writer, sock, client.loop_write)
+
+    def _on_socket_unregister_write(self, client, userdata, sock):
+        self._on_loop(self.loop.remove_writer, sock)
+
+    # --- Maintenance ---
+
+    async def _misc_loop(self):
+        """Keepalive et retransmissions : loop_misc() une fois par seconde tant que la connexion vit"""
+        try:
+            while self.client.loop_misc() == mqtt.MQTT_ERR_SUCCESS:
+                await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            pass
+
+    def _schedule_reconnect(self):
+        if self._stopping or (self._reconnect_task and not self._reconnect_task.done()):
+            return
+        self._reconnect_task = self.loop.create_task(self._reconnect())
+
+    async def _reconnect(self):
+        while not self._stopping:
+            await asyncio.sleep(self.supervisor.next_delay())
+            self.supervisor.connecting()
+            try:
+                await self.loop.run_in_executor(None, self.client.reconnect)
+                logger.info("🔗 Reconnexion MQTT (asyncio) initiée")
+                return
+            except Exception as e:
+                logger.error("❌ Échec de reconnexion MQTT: %s", e)
+                self.supervisor.disconnected(e)
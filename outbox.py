@@ -0,0 +1,91 @@
+import json
+import os
+import threading
+import time
+from collections import deque, namedtuple
+
+from files import write_json_atomic
+from logs import get_logger
+from metrics import metrics
+
+logger = get_logger("outbox")
+
+# Commandes conservées pendant une déconnexion du broker
+OUTBOX_SIZE = int(os.getenv("OUTBOX_SIZE", "100"))
+# Âge (s) au-delà duquel une commande en attente n'est plus rejouée
+OUTBOX_TTL = float(os.getenv("OUTBOX_TTL", "300"))
+# Fichier de persistance de la file (vide : en mémoire uniquement)
+OUTBOX_PATH = os.getenv("OUTBOX_PATH", "")
+
+OUTBOX_EVENTS = metrics.counter("mqtt_outbox_total", "Commandes passées par la file hors-ligne", ("event",))
+
+# Résultat d'une publication mise en attente (voir BrokerConnection.publish)
+QUEUED = "queued"
+
+# Publication en attente : topic, payload, QoS, retain, horodatage de la demande,
+# durée de conservation propre (None : celle de la file)
+PendingPublish = namedtuple("PendingPublish", ["topic", "payload", "qos", "retain", "created", "ttl"],
+                            defaults=(None,))
+
+
+class Outbox:
+    """File bornée des publications faites pendant une déconnexion, rejouée dans l'ordre à la reconnexion"""
+
+    def __init__(self, size=OUTBOX_SIZE, ttl=OUTBOX_TTL, path=OUTBOX_PATH):
+        self.ttl = ttl
+        self.path = path
+        self._queue = deque(maxlen=size)
+        self.lock = threading.Lock()
+        self._load()
+
+    def __len__(self):
+        return len(self._queue)
+
+    def push(self, topic, payload, qos, retain=False, ttl=None):
+        """Met une publication en attente (à appeler avec `lock`) ; la plus ancienne est perdue si la file est pleine"""
+        if len(self._queue) == self._queue.maxlen:
+            dropped = self._queue[0]
+            OUTBOX_EVENTS.inc("dropped")
+            logger.warning("⚠️ File hors-ligne pleine, commande abandonnée: %s", dropped.topic)
+        self._queue.append(PendingPublish(topic, payload, qos, retain, time.time(), ttl))
+        OUTBOX_EVENTS.inc("queued")
+        self._save()
+
+    def drain(self, now=None):
+        """Retire toutes les publications en attente (à appeler avec `lock`), sans les expirées"""
+        if now is None:
+            now = time.time()
+        fresh = []
+        while self._queue:
+            item = self._queue.popleft()
+            if now - item.created > (self.ttl if item.ttl is None else item.ttl):
+                OUTBOX_EVENTS.inc("expired")
+                logger.warning("⌛ Commande expirée non rejouée: %s (%s)", item.topic, item.payload)
+            else:
+                fresh.append(item)
+        self._save()
+        return fresh
+
+    def _save(self):
+        if not self.path:
+            return
+        try:
+            write_json_atomic(self.path, [list(item) for item in self._queue])
+        except Exception as e:
+            logger.error("❌ Erreur sauvegarde de la file hors-ligne: %s", e)
+
+    def _load(self):
+        if not self.path:
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                items = json.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            logger.error("❌ Erreur lecture de la file hors-ligne %s: %s", self.path, e)
+            return
+        for item in items:
+            self._queue.append(PendingPublish(*item))
+        if self._queue:
+            logger.info("♻️ %d commandes en attente restaurées depuis %s", len(self._queue), self.path)
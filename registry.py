@@ -0,0 +1,146 @@
+import json
+import os
+import threading
+from collections import namedtuple
+
+from logs import get_logger
+
+logger = get_logger("registry")
+
+SENSORS_CONFIG = os.getenv("SENSORS_CONFIG", "sensors.json")
+
+# Description d'un capteur : clé interne, topic MQTT (jokers +/# acceptés), champ JSON, unité, type, QoS,
+# broker d'origine (None : broker par défaut)
+SensorEntry = namedtuple("SensorEntry", ["key", "topic", "field", "unit", "kind", "qos", "broker"], defaults=(None,))
+
+# Description d'un actionneur : clé (pièce), topic de commande, type (light...), QoS,
+# topic sur lequel l'appareil publie son état (confirmation des commandes), broker de l'appareil,
+# durée (s) de conservation d'une commande faite pendant une déconnexion (None : OUTBOX_TTL, 0 : jamais)
+ActuatorEntry = namedtuple("ActuatorEntry", ["key", "topic", "kind", "qos", "state_topic", "broker", "outbox_ttl"],
+                           defaults=(None, None))
+
+Registry = namedtuple("Registry", ["sensors", "actuators"])
+
+DEFAULT_UNITS = {"temperature": "°C"}
+RELOAD_INTERVAL = float(os.getenv("SENSORS_RELOAD_INTERVAL", "5"))
+# Un déverrouillage rejoué plusieurs minutes après la demande est dangereux :
+# par défaut, les commandes de verrou ne sont pas mises en attente
+DEFAULT_OUTBOX_TTL = {"lock": float(os.getenv("LOCK_OUTBOX_TTL", "0"))}
+
+
+def _parse_sensor(item):
+    kind = item.get("kind", "temperature")
+    qos = int(item.get("qos", 0))
+    if qos not in (0, 1, 2):
+        raise ValueError(f"QoS invalide pour {item.get('key')}: {qos}")
+    return SensorEntry(
+        key=item["key"],
+        topic=item["topic"],
+        field=item.get("field", "value"),
+        unit=item.get("unit", DEFAULT_UNITS.get(kind, "")),
+        kind=kind,
+        qos=qos,
+        broker=item.get("broker"),
+    )
+
+
+def _parse_actuator(item):
+    topic = item["topic"]
+    # zigbee2mqtt : commande sur "<appareil>/set", état publié sur "<appareil>"
+    default_state_topic = topic[:-len("/set")] if topic.endswith("/set") else topic
+    kind = item.get("kind", "light")
+    outbox_ttl = item.get("outbox_ttl", DEFAULT_OUTBOX_TTL.get(kind))
+    return ActuatorEntry(
+        key=item["key"].lower(),
+        topic=topic,
+        kind=kind,
+        qos=int(item.get("qos", 0)),
+        state_topic=item.get("state_topic", default_state_topic),
+        broker=item.get("broker"),
+        outbox_ttl=None if outbox_ttl is None else float(outbox_ttl),
+    )
+
+
+def load_registry(path=SENSORS_CONFIG):
+    """Charge le registre des capteurs et des actionneurs depuis le fichier de configuration JSON"""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    sensors = {}
+    for item in data.get("sensors", []):
+        entry = _parse_sensor(item)
+        if entry.key in sensors:
+            logger.warning("⚠️ Capteur '%s' défini plusieurs fois dans %s", entry.key, path)
+        sensors[entry.key] = entry
+
+    actuators = {}
+    for item in data.get("actuators", []):
+        entry = _parse_actuator(item)
+        actuators[(entry.kind, entry.key)] = entry
+    return Registry(sensors, actuators)
+
+
+def subscriptions(sensors):
+    """Liste (topic, qos) dédupliquée, avec la QoS la plus élevée par topic"""
+    topics = {}
+    for entry in sensors.values():
+        topics[entry.topic] = max(entry.qos, topics.get(entry.topic, 0))
+    return list(topics.items())
+
+
+def diff_subscriptions(old, new):
+    """Topics à désabonner et (topic, qos) à abonner pour passer de `old` à `new`"""
+    old_topics = dict(subscriptions(old))
+    new_topics = dict(subscriptions(new))
+    removed = [topic for topic in old_topics if topic not in new_topics]
+    added = [(topic, qos) for topic, qos in new_topics.items() if old_topics.get(topic) != qos]
+    return removed, added
+
+
+class RegistryWatcher:
+    """Surveille le fichier de configuration et appelle `callback` à chaque modification"""
+
+    def __init__(self, callback, path=SENSORS_CONFIG, interval=RELOAD_INTERVAL):
+        self.callback = callback
+        self.path = path
+        self.interval = interval
+        self._signature = self._stat()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.path)
+            return stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return None
+
+    def check(self):
+        """Déclenche le rechargement si le fichier a changé depuis le dernier rechargement réussi
+
+        Un rechargement refusé (`callback` retourne False ou lève une exception) n'est pas
+        mémorisé : il est retenté à la vérification suivante.
+        """
+        signature = self._stat()
+        if signature is None or signature == self._signature:
+            return False
+        if self.callback() is False:
+            return False
+        self._signature = signature
+        return True
+
+    def start(self):
+        def run():
+            while not self._stop.wait(self.interval):
+                try:
+                    self.check()
+                except Exception as e:
+                    logger.error("❌ Erreur rechargement du registre: %s", e)
+
+        self._thread = threading.Thread(target=run, name="registry-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=2)
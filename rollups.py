@@ -0,0 +1,189 @@
+import json
+import os
+import threading
+import time
+
+from files import write_json_atomic
+from logs import get_logger
+
+logger = get_logger("rollups")
+
+ROLLUPS_PATH = os.getenv("ROLLUPS_PATH", "data/rollups.json")
+# Intervalle (s) entre deux sauvegardes complètes ; les mesures plus récentes sont rejouées
+# depuis la TSDB au démarrage
+ROLLUPS_SAVE_INTERVAL = float(os.getenv("ROLLUPS_SAVE_INTERVAL", "3600"))
+
+# Résolution (s) → nombre de buckets conservés
+RESOLUTIONS = {
+    60: 2 * 24 * 60,      # 1 min sur 48h
+    3600: 90 * 24,        # 1 h sur 90 jours
+    86400: 5 * 366,       # 1 jour sur 5 ans
+}
+
+# Nombre maximal de buckets fusionnés par requête
+MAX_BUCKETS_PER_QUERY = 1500
+
+COUNT, MIN, MAX, SUM, LAST = range(5)
+
+
+class RollupEngine:
+    """Agrégats (count/min/max/sum/last) par capteur et par bucket, mis à jour à chaque mesure"""
+
+    def __init__(self, resolutions=None, save_interval=ROLLUPS_SAVE_INTERVAL):
+        self.resolutions = dict(resolutions or RESOLUTIONS)
+        self.save_interval = save_interval
+        # (clé, résolution) → {début du bucket: [count, min, max, sum, last]}
+        self._series = {}
+        self._lock = threading.Lock()
+        # Horodatage de la dernière sauvegarde chargée ou écrite (None : aucune)
+        self.saved_at = None
+        self._changed = False
+
+    def add(self, key, value, timestamp=None):
+        """Intègre une mesure dans les buckets de chaque résolution, en O(1)"""
+        if timestamp is None:
+            timestamp = time.time()
+        with self._lock:
+            self._changed = True
+            for resolution, max_buckets in self.resolutions.items():
+                series = self._series.get((key, resolution))
+                if series is None:
+                    series = self._series[(key, resolution)] = {}
+                start = int(timestamp // resolution) * resolution
+                bucket = series.get(start)
+                if bucket is None:
+                    series[start] = [1, value, value, value, value]
+                    # Les buckets sont créés dans l'ordre chronologique : le premier est le plus ancien
+                    while len(series) > max_buckets:
+                        del series[next(iter(series))]
+                else:
+                    bucket[COUNT] += 1
+                    if value < bucket[MIN]:
+                        bucket[MIN] = value
+                    if value > bucket[MAX]:
+                        bucket[MAX] = value
+                    bucket[SUM] += value
+                    bucket[LAST] = value
+
+    def merge(self, older):
+        """Intègre des agrégats antérieurs à toutes les mesures déjà reçues (reconstruits au démarrage) :
+        les buckets communs sont fusionnés, leur dernière valeur reste la plus récente"""
+        with older._lock:
+            older_series = {series_key: {start: list(bucket) for start, bucket in series.items()}
+                            for series_key, series in older._series.items()}
+        with self._lock:
+            for (key, resolution), series in older_series.items():
+                max_buckets = self.resolutions.get(resolution)
+                if max_buckets is None:
+                    continue
+                for start, bucket in self._series.get((key, resolution), {}).items():
+                    previous = series.get(start)
+                    if previous is None:
+                        series[start] = bucket
+                    else:
+                        bucket[COUNT] += previous[COUNT]
+                        bucket[MIN] = min(bucket[MIN], previous[MIN])
+                        bucket[MAX] = max(bucket[MAX], previous[MAX])
+                        bucket[SUM] += previous[SUM]
+                        series[start] = bucket
+                # Ordre chronologique rétabli, puis purge des buckets les plus anciens
+                starts = sorted(series)[-max_buckets:]
+                self._series[(key, resolution)] = {start: series[start] for start in starts}
+            self.saved_at = older.saved_at
+            self._changed = self._changed or older._changed
+
+    def _resolution_for(self, seconds):
+        """Résolution la plus fine permettant de couvrir la fenêtre en peu de buckets"""
+        for resolution in sorted(self.resolutions):
+            if seconds / resolution <= MAX_BUCKETS_PER_QUERY:
+                return resolution
+        return max(self.resolutions)
+
+    def buckets(self, key, start, end, resolution=None):
+        """Liste des (début, bucket) d'un capteur entre start et end"""
+        if resolution is None:
+            resolution = self._resolution_for(end - start)
+        first = int(start // resolution) * resolution
+        with self._lock:
+            series = self._series.get((key, resolution))
+            if not series:
+                return []
+            return [(bucket_start, list(series[bucket_start]))
+                    for bucket_start in range(first, int(end) + 1, resolution)
+                    if bucket_start in series]
+
+    def stats(self, key, start, end=None):
+        """Statistiques d'une fenêtre, calculées à partir des agrégats uniquement"""
+        if end is None:
+            end = time.time()
+        rows = self.buckets(key, start, end)
+        if not rows:
+            return None
+
+        count = sum(bucket[COUNT] for _, bucket in rows)
+        stats = {
+            "count": count,
+            "min": min(bucket[MIN] for _, bucket in rows),
+            "max": max(bucket[MAX] for _, bucket in rows),
+            "mean": sum(bucket[SUM] for _, bucket in rows) / count,
+            "last": rows[-1][1][LAST],
+            "trend": 0.0,
+        }
+
+        # Tendance : moyenne de la seconde moitié des buckets moins celle de la première
+        half = len(rows) // 2
+        if half:
+            first, second = rows[:half], rows[half:]
+            first_mean = sum(b[SUM] for _, b in first) / sum(b[COUNT] for _, b in first)
+            second_mean = sum(b[SUM] for _, b in second) / sum(b[COUNT] for _, b in second)
+            elapsed = (second[0][0] + second[-1][0] - first[0][0] - first[-1][0]) / 2
+            if elapsed > 0:
+                stats["trend"] = (second_mean - first_mean) / elapsed * 3600
+        return stats
+
+    def daily_summary(self, key, days, now=None):
+        """Résumé jour par jour (début du jour, min, max, moyenne) sur les `days` derniers jours"""
+        if now is None:
+            now = time.time()
+        rows = self.buckets(key, now - days * 86400, now, resolution=86400)
+        return [(start, bucket[MIN], bucket[MAX], bucket[SUM] / bucket[COUNT]) for start, bucket in rows]
+
+    def save_due(self, now=None):
+        """Vrai si des mesures ont été intégrées et que la dernière sauvegarde date de plus de save_interval"""
+        if now is None:
+            now = time.time()
+        return self._changed and (self.saved_at is None or now - self.saved_at >= self.save_interval)
+
+    def save(self, path=ROLLUPS_PATH):
+        """Sauvegarde les agrégats (écriture atomique)"""
+        with self._lock:
+            saved_at = time.time()
+            self._changed = False
+            data = {
+                "saved_at": saved_at,
+                "series": [[key, resolution, list(series.items())]
+                           for (key, resolution), series in self._series.items()],
+            }
+        write_json_atomic(path, data)
+        self.saved_at = saved_at
+
+    def load(self, path=ROLLUPS_PATH):
+        """Recharge les agrégats sauvegardés, si présents"""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if isinstance(data, list):
+                # Ancien format : liste des séries, sans horodatage de sauvegarde
+                data = {"saved_at": os.path.getmtime(path), "series": data}
+        except FileNotFoundError:
+            return 0
+        except Exception as e:
+            logger.error("❌ Erreur chargement des agrégats: %s", e)
+            return 0
+
+        with self._lock:
+            for key, resolution, items in data["series"]:
+                if resolution in self.resolutions:
+                    self._series[(key, resolution)] = {int(start): bucket for start, bucket in items}
+            self.saved_at = data["saved_at"]
+        return len(data["series"])
@@ -0,0 +1,46 @@
+import os
+
+from logs import get_logger
+
+logger = get_logger("routing")
+
+# Table de routage des notifications : "security=123,alert=456,ext_t=789"
+# (clé de capteur ou catégorie → identifiant de canal Discord)
+NOTIFICATION_ROUTES = os.getenv("NOTIFICATION_ROUTES", "")
+
+# Catégories prioritaires : jamais retardées par le regroupement ni par les autres notifications
+PRIORITY_CATEGORIES = {c.strip() for c in os.getenv("PRIORITY_CATEGORIES", "security").split(",") if c.strip()}
+
+
+def parse_routes(spec):
+    """Convertit "nom=canal,nom=canal" en dictionnaire nom → identifiant de canal"""
+    routes = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        name, _, channel = item.partition("=")
+        try:
+            routes[name.strip()] = int(channel)
+        except ValueError:
+            logger.error("❌ Route de notification invalide: %s", item)
+    return routes
+
+
+class NotificationRouter:
+    """Choisit le canal d'une notification à partir du capteur concerné ou de sa catégorie"""
+
+    def __init__(self, default_channel_id, routes=None):
+        self.default_channel_id = default_channel_id
+        self.routes = parse_routes(NOTIFICATION_ROUTES) if routes is None else dict(routes)
+
+    def route(self, category=None, key=None):
+        """Canal de la notification : route du capteur, puis de la catégorie, sinon canal par défaut"""
+        if key is not None and key in self.routes:
+            return self.routes[key]
+        if category is not None and category in self.routes:
+            return self.routes[category]
+        return self.default_channel_id
+
+    @staticmethod
+    def is_priority(category):
+        return category in PRIORITY_CATEGORIES
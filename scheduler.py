@@ -0,0 +1,171 @@
+import asyncio
+import os
+import time
+
+from logs import get_logger
+from metrics import metrics
+
+logger = get_logger("scheduler")
+
+# Limite Discord : 5 messages par 5 secondes et par canal
+CHANNEL_RATE_MESSAGES = int(os.getenv("CHANNEL_RATE_MESSAGES", "5"))
+CHANNEL_RATE_PERIOD = float(os.getenv("CHANNEL_RATE_PERIOD", "5"))
+# Fenêtre (s) de regroupement des notifications pendant une rafale
+COALESCE_WINDOW = float(os.getenv("COALESCE_WINDOW", "0.3"))
+# Une notification identique à la précédente est ignorée pendant ce délai (s)
+DUPLICATE_WINDOW = float(os.getenv("DUPLICATE_WINDOW", "60"))
+# Notifications en attente par canal au-delà desquelles les plus anciennes sont abandonnées
+CHANNEL_QUEUE_SIZE = int(os.getenv("CHANNEL_QUEUE_SIZE", "100"))
+# Taille maximale d'un message Discord
+MAX_MESSAGE_LENGTH = 2000
+
+DISCORD_SUPPRESSED = metrics.counter("discord_suppressed_total", "Notifications identiques consécutives ignorées")
+DISCORD_COALESCED = metrics.counter("discord_coalesced_total", "Notifications fusionnées dans un résumé")
+DISCORD_DROPPED = metrics.counter("discord_dropped_total", "Notifications abandonnées (file du canal pleine)")
+DISCORD_RATE_WAIT = metrics.histogram("discord_rate_wait_seconds", "Attente d'un jeton du limiteur de débit")
+
+
+class TokenBucket:
+    """Seau à jetons : `capacity` envois par `period` secondes, rechargé en continu"""
+
+    def __init__(self, capacity=CHANNEL_RATE_MESSAGES, period=CHANNEL_RATE_PERIOD):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self):
+        """Secondes à attendre avant qu'un jeton soit disponible"""
+        self._refill(time.monotonic())
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self._refill(time.monotonic())
+        self.tokens -= 1
+
+    def idle(self):
+        """Vrai si aucun envoi récent n'a entamé le seau"""
+        self._refill(time.monotonic())
+        return self.tokens >= self.capacity - 1
+
+
+class _Channel:
+    __slots__ = ("bucket", "urgent", "pending", "last_message", "last_time", "task", "wakeup")
+
+    def __init__(self):
+        self.bucket = TokenBucket()
+        # Notifications prioritaires (sécurité), envoyées avant toutes les autres
+        self.urgent = []
+        self.pending = []
+        self.last_message = None
+        self.last_time = 0.0
+        self.task = None
+        # Réveille la tâche du canal pendant la fenêtre de regroupement quand une priorité arrive
+        self.wakeup = asyncio.Event()
+
+
+class SendScheduler:
+    """Planifie les envois avec une tâche et une file bornée par canal : limite de débit,
+    regroupement des rafales et anti-doublons"""
+
+    def __init__(self, send, coalesce_window=COALESCE_WINDOW, duplicate_window=DUPLICATE_WINDOW,
+                 max_pending=CHANNEL_QUEUE_SIZE):
+        # Coroutine d'envoi effectif : send(message, channel_id)
+        self.send = send
+        self.coalesce_window = coalesce_window
+        self.duplicate_window = duplicate_window
+        self.max_pending = max_pending
+        self._channels = {}
+
+    def submit(self, message, channel_id=None, priority=False):
+        """Ajoute une notification (à appeler depuis la boucle asyncio)"""
+        channel = self._channels.get(channel_id)
+        if channel is None:
+            channel = self._channels[channel_id] = _Channel()
+
+        now = time.monotonic()
+        if message == channel.last_message and now - channel.last_time < self.duplicate_window:
+            DISCORD_SUPPRESSED.inc()
+            logger.debug("🔁 Notification identique ignorée: %s", message)
+            return False
+        channel.last_message = message
+        channel.last_time = now
+
+        if priority:
+            channel.urgent.append(message)
+            channel.wakeup.set()
+        else:
+            # Les producteurs MQTT ne peuvent pas attendre : file pleine, la plus ancienne est abandonnée
+            if len(channel.pending) >= self.max_pending:
+                channel.pending.pop(0)
+                DISCORD_DROPPED.inc()
+                logger.warning("⚠️ File du canal %s pleine, notification la plus ancienne abandonnée", channel_id)
+            channel.pending.append(message)
+        if channel.task is None or channel.task.done():
+            channel.task = asyncio.get_running_loop().create_task(self._drain(channel_id, channel))
+        return True
+
+    async def _drain(self, channel_id, channel):
+        """Envoie les notifications en attente d'un canal, en respectant son seau à jetons"""
+        while channel.urgent or channel.pending:
+            # Canal inactif : envoi immédiat ; en pleine rafale, on laisse les suivantes arriver
+            if not channel.urgent and not channel.bucket.idle() and self.coalesce_window:
+                channel.wakeup.clear()
+                try:
+                    await asyncio.wait_for(channel.wakeup.wait(), self.coalesce_window)
+                except asyncio.TimeoutError:
+                    pass
+            wait = channel.bucket.delay()
+            if wait:
+                DISCORD_RATE_WAIT.observe(wait)
+                await asyncio.sleep(wait)
+
+            # Le premier jeton disponible revient toujours aux notifications prioritaires
+            if channel.urgent:
+                batch, channel.urgent = channel.urgent, []
+            else:
+                batch, channel.pending = channel.pending, []
+            if len(batch) > 1:
+                DISCORD_COALESCED.inc(amount=len(batch))
+            for index, text in enumerate(_digest(batch)):
+                if index:
+                    wait = channel.bucket.delay()
+                    if wait:
+                        DISCORD_RATE_WAIT.observe(wait)
+                        await asyncio.sleep(wait)
+                channel.bucket.take()
+                try:
+                    await self.send(text, channel_id)
+                except Exception as e:
+                    logger.error("❌ Erreur envoi planifié: %s", e)
+
+    def pending(self):
+        """Nombre de notifications en attente d'envoi, tous canaux confondus"""
+        return sum(len(channel.urgent) + len(channel.pending) for channel in self._channels.values())
+
+    def stop(self):
+        for channel in self._channels.values():
+            if channel.task and not channel.task.done():
+                channel.task.cancel()
+
+
+def _digest(messages):
+    """Fusionne des notifications en un ou plusieurs messages sous la limite de taille de Discord"""
+    if len(messages) == 1:
+        return [messages[0][:MAX_MESSAGE_LENGTH]]
+    header = f"📋 **{len(messages)} notifications :**"
+    chunks = []
+    current = header
+    for message in messages:
+        line = message[:MAX_MESSAGE_LENGTH - len(header) - 1]
+        if len(current) + 1 + len(line) > MAX_MESSAGE_LENGTH:
+            chunks.append(current)
+            current = line
+        else:
+            current += "\n" + line
+    chunks.append(current)
+    return chunks
@@ -0,0 +1,62 @@
+import json
+import os
+import threading
+import time
+
+from files import write_json_atomic
+from logs import get_logger
+
+logger = get_logger("snapshot")
+
+SNAPSHOT_PATH = os.getenv("SNAPSHOT_PATH", "data/snapshot.json")
+SNAPSHOT_INTERVAL = float(os.getenv("SNAPSHOT_INTERVAL", "60"))
+
+
+class StateSnapshot:
+    """Sauvegarde périodique du dernier état connu, pour un démarrage à chaud"""
+
+    def __init__(self, path=SNAPSHOT_PATH, interval=SNAPSHOT_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def load(self):
+        """Charge le snapshot : {"values": {clé: [valeur, timestamp]}, "nuki": état, "saved_at": ts}"""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.error("❌ Erreur lecture du snapshot %s: %s", self.path, e)
+            return None
+        if not isinstance(data, dict) or not isinstance(data.get("values"), dict):
+            return None
+        return data
+
+    def save(self, values, timestamps, nuki_state):
+        """Écrit le snapshot de façon atomique (fichier temporaire puis renommage)"""
+        data = {
+            "saved_at": time.time(),
+            "nuki": nuki_state,
+            "values": {key: [value, timestamps.get(key)] for key, value in values.items()},
+        }
+        write_json_atomic(self.path, data)
+
+    def start(self, callback):
+        """Appelle `callback` toutes les `interval` secondes dans un thread dédié"""
+        def run():
+            while not self._stop.wait(self.interval):
+                try:
+                    callback()
+                except Exception as e:
+                    logger.error("❌ Erreur sauvegarde périodique: %s", e)
+
+        self._thread = threading.Thread(target=run, name="snapshot", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=2)
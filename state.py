@@ -0,0 +1,113 @@
+import threading
+from collections import namedtuple
+from collections.abc import Mapping
+from types import MappingProxyType
+
+# Vue immuable de l'état à une version donnée
+Snapshot = namedtuple("Snapshot", ["version", "values", "timestamps"])
+
+_EMPTY = MappingProxyType({})
+
+
+class StateStore:
+    """État des capteurs en copy-on-write : les lecteurs obtiennent un snapshot immuable et versionné,
+    que les écritures MQTT ne peuvent plus modifier"""
+
+    def __init__(self):
+        self._snapshot = Snapshot(0, _EMPTY, _EMPTY)
+        # État de travail, modifié uniquement sous le verrou d'écriture
+        self._values = {}
+        self._timestamps = {}
+        self._version = 0
+        self._dirty = False
+        self._write_lock = threading.Lock()
+        # nom de la vue → (version, résultat)
+        self._views = {}
+
+    def snapshot(self):
+        """Snapshot courant : sans verrou tant que l'état n'a pas changé depuis le dernier snapshot"""
+        snapshot = self._snapshot
+        if not self._dirty:
+            return snapshot
+        # La copie n'est faite qu'une fois par version lue, pas à chaque message MQTT
+        with self._write_lock:
+            if self._dirty:
+                self._snapshot = Snapshot(self._version,
+                                          MappingProxyType(dict(self._values)),
+                                          MappingProxyType(dict(self._timestamps)))
+                self._dirty = False
+            return self._snapshot
+
+    @property
+    def version(self):
+        return self._version
+
+    def update(self, key, value, timestamp):
+        """Enregistre une valeur, en O(1)"""
+        with self._write_lock:
+            self._values[key] = value
+            self._timestamps[key] = timestamp
+            self._version += 1
+            self._dirty = True
+
+    def touch(self, keys, timestamp):
+        """Rafraîchit l'horodatage de valeurs connues, republiées à l'identique"""
+        with self._write_lock:
+            touched = False
+            for key in keys:
+                if key in self._values:
+                    self._timestamps[key] = timestamp
+                    touched = True
+            if touched:
+                self._version += 1
+                self._dirty = True
+
+    def update_retained(self, key, value):
+        """Enregistre une valeur retenue par le broker, d'âge inconnu : l'horodatage existant est
+        conservé (aucun s'il n'y en a pas), et rien ne change si la valeur est déjà connue"""
+        with self._write_lock:
+            if key in self._values and self._values[key] == value:
+                return False
+            self._values[key] = value
+            self._timestamps.setdefault(key, None)
+            self._version += 1
+            self._dirty = True
+            return True
+
+    def update_many(self, values, timestamps):
+        """Enregistre plusieurs valeurs en une seule version"""
+        with self._write_lock:
+            self._values.update(values)
+            self._timestamps.update(timestamps)
+            self._version += 1
+            self._dirty = True
+
+    def view(self, name, builder):
+        """Vue dérivée `builder(snapshot)`, recalculée uniquement quand la version change"""
+        snapshot = self.snapshot()
+        cached = self._views.get(name)
+        if cached is not None and cached[0] == snapshot.version:
+            return cached[1]
+        result = builder(snapshot)
+        self._views[name] = (snapshot.version, result)
+        return result
+
+    def live_values(self):
+        """Mapping en lecture seule qui reflète toujours le snapshot courant"""
+        return _LiveValues(self)
+
+
+class _LiveValues(Mapping):
+    """Compatibilité avec l'ancien dictionnaire dico_valeurs partagé"""
+
+    def __init__(self, store):
+        self._store = store
+
+    def __getitem__(self, key):
+        return self._store.snapshot().values[key]
+
+    def __iter__(self):
+        return iter(self._store.snapshot().values)
+
+    def __len__(self):
+        return len(self._store.snapshot().values)
@@ -0,0 +1,112 @@
+import os
+import random
+import threading
+import time
+from collections import deque, namedtuple
+
+from logs import get_logger
+from metrics import metrics
+
+logger = get_logger("supervisor")
+
+# États d'une connexion à un broker
+CONNECTING = "connecting"
+CONNECTED = "connected"
+DISCONNECTED = "disconnected"
+BACKOFF = "backoff"
+STOPPED = "stopped"
+
+# Durée (s) au-delà de laquelle une connexion est stable : le délai de reconnexion repart du minimum
+STABLE_CONNECTION = float(os.getenv("MQTT_STABLE_CONNECTION", "30"))
+# Transitions conservées pour /mqtt_status
+TRANSITIONS_KEPT = 10
+
+MQTT_TRANSITIONS = metrics.counter("mqtt_connection_transitions_total", "Changements d'état des connexions MQTT",
+                                   ("broker", "state"))
+MQTT_OUTAGE_SECONDS = metrics.histogram("mqtt_outage_seconds", "Durée des coupures de connexion MQTT", ("broker",),
+                                        buckets=(1, 5, 15, 60, 300, 900, 3600, 21600))
+
+# Changement d'état : nouvel état, horodatage, raison éventuelle
+Transition = namedtuple("Transition", ["state", "time", "reason"])
+
+
+class Backoff:
+    """Délai exponentiel avec gigue : une moitié fixe, l'autre tirée au hasard, pour que des
+    clients coupés au même moment ne se reconnectent pas tous ensemble"""
+
+    def __init__(self, minimum, maximum):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.attempts = 0
+
+    def next(self):
+        delay = min(self.maximum, self.minimum * 2 ** min(self.attempts, 30))
+        self.attempts += 1
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def reset(self):
+        self.attempts = 0
+
+
+class ConnectionSupervisor:
+    """État d'une connexion broker (transitions, dernière erreur, durée des coupures) et délais de reconnexion"""
+
+    def __init__(self, name, reconnect_min, reconnect_max):
+        self.name = name
+        self.backoff = Backoff(reconnect_min, reconnect_max)
+        self.state = DISCONNECTED
+        self.since = time.time()
+        self.session_present = False
+        self.last_error = None
+        self.next_attempt = None
+        # Début de la coupure en cours (None une fois connecté)
+        self.down_since = None
+        self.transitions = deque(maxlen=TRANSITIONS_KEPT)
+        self._lock = threading.Lock()
+
+    def _transition(self, state, reason=None):
+        with self._lock:
+            now = time.time()
+            previous, self.state, self.since = self.state, state, now
+            self.transitions.append(Transition(state, now, reason))
+        MQTT_TRANSITIONS.inc(self.name, state)
+        logger.info("🔀 [%s] %s → %s%s", self.name, previous, state, f" ({reason})" if reason else "")
+        return now
+
+    def connecting(self):
+        self._transition(CONNECTING)
+
+    def connected(self, session_present=False):
+        self.session_present = session_present
+        now = self._transition(CONNECTED, "session reprise" if session_present else None)
+        if self.down_since is not None:
+            MQTT_OUTAGE_SECONDS.observe(now - self.down_since, self.name)
+            logger.info("✅ [%s] Reconnecté après %.1fs de coupure", self.name, now - self.down_since)
+        self.down_since = None
+        self.next_attempt = None
+        self.last_error = None
+
+    def disconnected(self, reason=None):
+        """Connexion perdue, ou tentative échouée (refus, broker injoignable...)"""
+        now = time.time()
+        if self.state == CONNECTED:
+            # Une connexion qui tombe aussitôt établie ne remet pas le délai à zéro
+            if now - self.since >= STABLE_CONNECTION:
+                self.backoff.reset()
+            self.down_since = now
+        elif self.down_since is None:
+            self.down_since = now
+        if reason is not None:
+            self.last_error = str(reason)
+        self._transition(DISCONNECTED, self.last_error)
+
+    def next_delay(self):
+        """Délai avant la prochaine tentative de connexion"""
+        delay = self.backoff.next()
+        self.next_attempt = time.time() + delay
+        self._transition(BACKOFF, f"{delay:.1f}s")
+        return delay
+
+    def stopped(self):
+        self.next_attempt = None
+        self._transition(STOPPED)
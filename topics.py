@@ -0,0 +1,102 @@
+import re
+
+# Nombre maximal de topics distincts mémorisés par le routeur
+MAX_CACHED_TOPICS = 4096
+
+
+def topic_slug(value):
+    """Normalise un segment de topic pour l'utiliser dans une clé de capteur"""
+    slug = re.sub(r"[^0-9a-z]+", "_", value.lower())
+    return slug.strip("_")
+
+
+def resolve_key(key, captures):
+    """Construit la clé finale d'un capteur enregistré avec des jokers (ex: 'zb_{}_t')"""
+    if not captures or "{" not in key:
+        return key
+    try:
+        return key.format(*[topic_slug(c) for c in captures])
+    except (IndexError, KeyError, ValueError):
+        return key
+
+
+class _TrieNode:
+    __slots__ = ("children", "routes")
+
+    def __init__(self):
+        self.children = {}
+        self.routes = []
+
+
+class TopicRouter:
+    """Index topic → routes : dictionnaire pour les topics exacts, trie pour les jokers MQTT (+/#)"""
+
+    def __init__(self):
+        self._exact = {}
+        self._trie = _TrieNode()
+        self._wildcards = 0
+        # Résultats mémorisés par topic reçu (vidé à chaque modification de l'index)
+        self._cache = {}
+
+    @staticmethod
+    def is_wildcard(pattern):
+        return "+" in pattern or "#" in pattern
+
+    def add(self, pattern, route):
+        """Enregistre une route pour un topic exact ou un filtre avec jokers"""
+        if self.is_wildcard(pattern):
+            node = self._trie
+            for level in pattern.split("/"):
+                node = node.children.setdefault(level, _TrieNode())
+            node.routes.append(route)
+            self._wildcards += 1
+        else:
+            self._exact.setdefault(pattern, []).append(route)
+        self._cache.clear()
+
+    def clear(self):
+        """Vide complètement l'index"""
+        self._exact = {}
+        self._trie = _TrieNode()
+        self._wildcards = 0
+        self._cache.clear()
+
+    def __len__(self):
+        return sum(len(routes) for routes in self._exact.values()) + self._wildcards
+
+    def match(self, topic):
+        """Retourne la liste des (route, segments capturés) correspondant au topic"""
+        cached = self._cache.get(topic)
+        if cached is not None:
+            return cached
+
+        matches = [(route, ()) for route in self._exact.get(topic, ())]
+        if self._wildcards:
+            levels = topic.split("/")
+            # Les topics système ($SYS...) ne sont pas couverts par un joker en premier niveau
+            self._walk(self._trie, levels, 0, (), matches, not topic.startswith("$"))
+
+        if len(self._cache) >= MAX_CACHED_TOPICS:
+            self._cache.clear()
+        self._cache[topic] = matches
+        return matches
+
+    def _walk(self, node, levels, depth, captures, matches, allow_wildcard):
+        hash_node = node.children.get("#") if allow_wildcard else None
+        if hash_node is not None:
+            rest = "/".join(levels[depth:])
+            for route in hash_node.routes:
+                matches.append((route, captures + (rest,) if rest else captures))
+
+        if depth == len(levels):
+            for route in node.routes:
+                matches.append((route, captures))
+            return
+
+        level = levels[depth]
+        child = node.children.get(level)
+        if child is not None:
+            self._walk(child, levels, depth + 1, captures, matches, True)
+        plus_node = node.children.get("+") if allow_wildcard else None
+        if plus_node is not None:
+            self._walk(plus_node, levels, depth + 1, captures + (level,), matches, True)
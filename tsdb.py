@@ -0,0 +1,227 @@
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from array import array
+
+from files import write_json_atomic
+from logs import get_logger
+
+logger = get_logger("tsdb")
+
+# Répertoire des segments et paramètres de rotation / rétention
+TSDB_DIR = os.getenv("TSDB_DIR", "data/tsdb")
+SEGMENT_SECONDS = int(os.getenv("TSDB_SEGMENT_HOURS", "24")) * 3600
+RETENTION_SECONDS = int(os.getenv("TSDB_RETENTION_DAYS", "90")) * 86400
+FLUSH_INTERVAL = float(os.getenv("TSDB_FLUSH_INTERVAL", "5"))
+FLUSH_BATCH = 512
+
+# Enregistrement : timestamp (float64), id capteur (uint32), valeur (float64)
+RECORD = struct.Struct("<dId")
+SEGMENT_PREFIX = "seg-"
+SEGMENT_SUFFIX = ".bin"
+
+
+class TimeSeriesStore:
+    """Stockage disque append-only des mesures, par segments horodatés lus via mmap"""
+
+    def __init__(self, directory=TSDB_DIR, segment_seconds=SEGMENT_SECONDS,
+                 retention_seconds=RETENTION_SECONDS, flush_interval=FLUSH_INTERVAL):
+        self.directory = directory
+        self.segment_seconds = segment_seconds
+        self.retention_seconds = retention_seconds
+        self.flush_interval = flush_interval
+
+        self._pending = []
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._last_purge = 0
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._sensors_path = os.path.join(self.directory, "sensors.json")
+        self._sensor_ids = self._load_sensor_ids()
+
+        self._writer = threading.Thread(target=self._run_writer, name="tsdb-writer", daemon=True)
+        self._writer.start()
+
+    # --- Identifiants de capteurs ---
+
+    def _load_sensor_ids(self):
+        try:
+            with open(self._sensors_path, "r", encoding="utf-8") as f:
+                return {key: int(sensor_id) for key, sensor_id in json.load(f).items()}
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.error("❌ Erreur lecture des identifiants TSDB: %s", e)
+            return {}
+
+    def _save_sensor_ids(self):
+        write_json_atomic(self._sensors_path, self._sensor_ids)
+
+    def _sensor_id(self, key):
+        """Identifiant numérique d'un capteur, attribué à la première mesure"""
+        sensor_id = self._sensor_ids.get(key)
+        if sensor_id is None:
+            sensor_id = len(self._sensor_ids)
+            self._sensor_ids[key] = sensor_id
+            self._save_sensor_ids()
+        return sensor_id
+
+    # --- Écriture ---
+
+    def append(self, key, value, timestamp=None):
+        """Ajoute une mesure au lot en attente (appelé depuis le thread MQTT)"""
+        if timestamp is None:
+            timestamp = time.time()
+        with self._lock:
+            self._pending.append((timestamp, key, float(value)))
+            if len(self._pending) >= FLUSH_BATCH:
+                self._wakeup.set()
+
+    def _segment_start(self, timestamp):
+        return int(timestamp // self.segment_seconds) * self.segment_seconds
+
+    def _segment_path(self, start):
+        return os.path.join(self.directory, f"{SEGMENT_PREFIX}{start}{SEGMENT_SUFFIX}")
+
+    def flush(self):
+        """Écrit sur disque les mesures en attente, regroupées par segment"""
+        with self._lock:
+            batch, self._pending = self._pending, []
+        if not batch:
+            return 0
+
+        with self._write_lock:
+            chunks = {}
+            for timestamp, key, value in batch:
+                record = RECORD.pack(timestamp, self._sensor_id(key), value)
+                chunks.setdefault(self._segment_start(timestamp), []).append(record)
+            for start, records in chunks.items():
+                with open(self._segment_path(start), "ab") as f:
+                    f.write(b"".join(records))
+        return len(batch)
+
+    def _run_writer(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+                self._purge_if_due()
+            except Exception as e:
+                logger.error("❌ Erreur écriture TSDB: %s", e)
+
+    def close(self):
+        """Arrête le thread d'écriture après un dernier flush"""
+        self._closed = True
+        self._wakeup.set()
+        self._writer.join(timeout=self.flush_interval + 1)
+        self.flush()
+
+    # --- Rétention ---
+
+    def segments(self):
+        """Liste triée des (début, chemin) des segments présents"""
+        result = []
+        for name in os.listdir(self.directory):
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX):
+                try:
+                    start = int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)])
+                except ValueError:
+                    continue
+                result.append((start, os.path.join(self.directory, name)))
+        result.sort()
+        return result
+
+    def purge(self, now=None):
+        """Supprime les segments entièrement sortis de la fenêtre de rétention"""
+        if now is None:
+            now = time.time()
+        removed = 0
+        with self._write_lock:
+            for start, path in self.segments():
+                if start + self.segment_seconds <= now - self.retention_seconds:
+                    os.remove(path)
+                    removed += 1
+        if removed:
+            logger.info("🧹 %s segment(s) TSDB expiré(s) supprimé(s)", removed)
+        return removed
+
+    def _purge_if_due(self):
+        now = time.time()
+        if now - self._last_purge >= 3600:
+            self._last_purge = now
+            self.purge(now)
+
+    # --- Lecture ---
+
+    def _first_index(self, view, count, since):
+        """Recherche dichotomique du premier enregistrement >= since dans un segment"""
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if RECORD.unpack_from(view, mid * RECORD.size)[0] < since:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _records(self, start, end):
+        """Parcourt dans l'ordre chronologique les (timestamp, id capteur, valeur) écrits sur disque
+        entre start et end : segments concernés lus via mmap, à partir d'une recherche dichotomique"""
+        for segment_start, path in self.segments():
+            if segment_start + self.segment_seconds <= start or segment_start > end:
+                continue
+            try:
+                with open(path, "rb") as f:
+                    count = os.fstat(f.fileno()).st_size // RECORD.size
+                    if not count:
+                        continue
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped, \
+                            memoryview(mapped) as view:
+                        first = self._first_index(view, count, start)
+                        with view[first * RECORD.size:count * RECORD.size] as records:
+                            for record in RECORD.iter_unpack(records):
+                                if record[0] > end:
+                                    break
+                                yield record
+            except FileNotFoundError:
+                continue
+
+    def query(self, key, start, end=None):
+        """Retourne (timestamps, valeurs) d'un capteur entre start et end, via mmap des segments"""
+        if end is None:
+            end = time.time()
+        timestamps, values = array("d"), array("d")
+        sensor_id = self._sensor_ids.get(key)
+
+        if sensor_id is not None:
+            for timestamp, record_id, value in self._records(start, end):
+                if record_id == sensor_id:
+                    timestamps.append(timestamp)
+                    values.append(value)
+
+        # Mesures pas encore écrites sur disque
+        with self._lock:
+            pending = list(self._pending)
+        for timestamp, pending_key, value in pending:
+            if pending_key == key and start <= timestamp <= end:
+                timestamps.append(timestamp)
+                values.append(value)
+        return timestamps, values
+
+    def replay(self, start, end=None):
+        """Parcourt dans l'ordre chronologique les (clé, timestamp, valeur) écrits entre start et end,
+        tous capteurs confondus (reconstruction des agrégats)"""
+        if end is None:
+            end = time.time()
+        keys = {sensor_id: key for key, sensor_id in self._sensor_ids.items()}
+        for timestamp, record_id, value in self._records(start, end):
+            key = keys.get(record_id)
+            if key is not None:
+                yield key, timestamp, value